@@ -0,0 +1,222 @@
+import os
+import json
+import logging
+import resource
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY_MIN = int(os.getenv("CONCURRENCY_MIN", 1))
+CONCURRENCY_MAX = int(os.getenv("CONCURRENCY_MAX", 4))
+# Defaults to the container's cgroup limit when unset
+MEMORY_LIMIT_MB = os.getenv("MEMORY_LIMIT_MB")
+# Accept new jobs while RSS stays under this share of the limit
+MEMORY_TARGET_FRACTION = float(os.getenv("MEMORY_TARGET_FRACTION", 0.75))
+# Stop consuming altogether above this share of the limit
+MEMORY_PAUSE_FRACTION = float(os.getenv("MEMORY_PAUSE_FRACTION", 0.9))
+# Assumed peak of a job until real jobs have been measured
+JOB_MEMORY_ESTIMATE_MB = float(os.getenv("JOB_MEMORY_ESTIMATE_MB", 256))
+JOB_MEMORY_WINDOW = int(os.getenv("JOB_MEMORY_WINDOW", 20))
+CONTROL_INTERVAL_SECONDS = float(os.getenv("CONTROL_INTERVAL_SECONDS", 1))
+# The consumer logs metrics() this often even when the decision did not change
+CONCURRENCY_METRICS_SECONDS = float(os.getenv("CONCURRENCY_METRICS_SECONDS", 60))
+
+MB = 1024 * 1024
+CGROUP_LIMITS = ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes")
+# (usage file, stat file, reclaimable page cache key) of cgroup v2 and v1
+CGROUP_USAGE = (
+    ("/sys/fs/cgroup/memory.current", "/sys/fs/cgroup/memory.stat", "inactive_file"),
+    ("/sys/fs/cgroup/memory/memory.usage_in_bytes", "/sys/fs/cgroup/memory/memory.stat", "total_inactive_file"),
+)
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Peak instead of current RSS where /proc is not available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _process_rss(pid) -> int:
+    with open(f"/proc/{pid}/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _children(pid):
+    children = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as listing:
+            children.extend(int(child) for child in listing.read().split())
+    return children
+
+
+def process_tree_rss_bytes() -> int:
+    """
+        RSS of this process and every process below it, such as the forkserver
+        and the CSV pool workers it started, which share the memory limit.
+    """
+    total = 0
+    pending = [os.getpid()]
+    try:
+        while pending:
+            pid = pending.pop()
+            try:
+                total += _process_rss(pid)
+                pending.extend(_children(pid))
+            except (FileNotFoundError, ProcessLookupError):
+                # Exited while we were looking
+                continue
+    except (OSError, ValueError, IndexError):
+        return rss_bytes()
+    return total
+
+
+def cgroup_working_set_bytes():
+    """
+        Memory charged to the container, every process included, minus the
+        page cache the kernel can reclaim; None outside a memory cgroup.
+    """
+    for usage_path, stat_path, inactive in CGROUP_USAGE:
+        try:
+            with open(usage_path) as usage_file:
+                usage = int(usage_file.read())
+        except (OSError, ValueError):
+            continue
+        try:
+            with open(stat_path) as stat_file:
+                stats = dict(line.split() for line in stat_file if line.strip())
+            usage -= int(stats.get(inactive, 0))
+        except (OSError, ValueError):
+            pass
+        return max(usage, 0)
+    return None
+
+
+def memory_limit_bytes():
+    if MEMORY_LIMIT_MB:
+        return int(float(MEMORY_LIMIT_MB) * MB)
+    for path in CGROUP_LIMITS:
+        try:
+            with open(path) as limit:
+                value = limit.read().strip()
+        except OSError:
+            continue
+        # cgroup v1 reports a huge number instead of "max" when unlimited
+        if value != "max" and int(value) < 1 << 60:
+            return int(value)
+    return None
+
+
+class ConcurrencyController:
+    """
+        Decides how many report jobs the consumer may run at once from the
+        memory in use (the cgroup's working set, or the RSS of this process and
+        its children), the memory recent jobs peaked at and the queue depth.
+        The consumer applies limit() as the channel prefetch and stops
+        consuming while paused() is true.
+    """
+
+    def __init__(self, min_jobs=CONCURRENCY_MIN, max_jobs=CONCURRENCY_MAX, memory_limit=None,
+                 target_fraction=MEMORY_TARGET_FRACTION, pause_fraction=MEMORY_PAUSE_FRACTION,
+                 job_estimate=JOB_MEMORY_ESTIMATE_MB * MB, window=JOB_MEMORY_WINDOW):
+        self.min_jobs = min_jobs
+        self.max_jobs = max(min_jobs, max_jobs)
+        # A cgroup limit is checked against the cgroup's own usage, which counts every process
+        self.cgroup = memory_limit is None and not MEMORY_LIMIT_MB
+        self.memory_limit = memory_limit if memory_limit is not None else memory_limit_bytes()
+        self.target_fraction = target_fraction
+        self.pause_fraction = pause_fraction
+        self.job_estimate = job_estimate
+        self._peaks = deque(maxlen=window)
+        # job id: (rss when it started, highest rss seen while it ran)
+        self._running = {}
+        self._lock = threading.Lock()
+        self._limit = min_jobs
+        self._paused = False
+        self.decisions = 0
+        self.last_metrics = {}
+
+    def usage(self) -> int:
+        """Memory in use that counts against memory_limit."""
+        if self.cgroup:
+            used = cgroup_working_set_bytes()
+            if used is not None:
+                return used
+        return process_tree_rss_bytes()
+
+    def job_started(self, job_id, rss=None):
+        rss = self.usage() if rss is None else rss
+        with self._lock:
+            self._running[job_id] = (rss, rss)
+
+    def job_finished(self, job_id, rss=None):
+        rss = self.usage() if rss is None else rss
+        with self._lock:
+            start, peak = self._running.pop(job_id, (rss, rss))
+            # Overlapping jobs are all charged the shared growth, which errs on the safe side
+            self._peaks.append(max(peak, rss) - start)
+
+    def sample(self, rss=None):
+        rss = self.usage() if rss is None else rss
+        with self._lock:
+            for job_id, (start, peak) in self._running.items():
+                if rss > peak:
+                    self._running[job_id] = (start, rss)
+        return rss
+
+    def job_peak_estimate(self) -> int:
+        with self._lock:
+            peaks = list(self._peaks)
+        if not peaks:
+            return int(self.job_estimate)
+        # Size for the big reports seen recently, not the average one
+        return max(max(peaks), MB)
+
+    def decide(self, queue_depth=0, rss=None):
+        """Returns (limit, paused) and records them as metrics."""
+        rss = self.sample(rss)
+        with self._lock:
+            inflight = len(self._running)
+        estimate = self.job_peak_estimate()
+
+        if self.memory_limit:
+            headroom = self.memory_limit * self.target_fraction - rss
+            limit = inflight + int(headroom // estimate)
+            paused = rss >= self.memory_limit * self.pause_fraction
+        else:
+            limit = self.max_jobs
+            paused = False
+        # No point holding more messages than there is work for
+        limit = min(limit, inflight + max(queue_depth, 0))
+        limit = max(self.min_jobs, min(self.max_jobs, limit))
+
+        changed = (limit, paused) != (self._limit, self._paused)
+        self._limit, self._paused = limit, paused
+        self.last_metrics = {
+            "rss_mb": round(rss / MB, 1),
+            "memory_limit_mb": round(self.memory_limit / MB, 1) if self.memory_limit else None,
+            "job_peak_estimate_mb": round(estimate / MB, 1),
+            "inflight": inflight,
+            "queue_depth": queue_depth,
+            "limit": limit,
+            "paused": paused,
+            "decisions": self.decisions,
+        }
+        if changed:
+            self.decisions += 1
+            self.last_metrics["decisions"] = self.decisions
+            logger.info(f"concurrency {json.dumps(self.last_metrics)}")
+        return limit, paused
+
+    def limit(self) -> int:
+        return self._limit
+
+    def paused(self) -> bool:
+        return self._paused
+
+    def metrics(self) -> dict:
+        return dict(self.last_metrics)
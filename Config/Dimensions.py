@@ -0,0 +1,106 @@
+import os
+import copy
+import time
+import logging
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TUTORS = 'tutors'
+PROGRAMS = 'programs'
+SUBJECTS = 'subjects'
+
+# name: (table, cached columns)
+TABLES = {
+    TUTORS: ("stu_tracker.Tutors", ["first_name", "last_name"]),
+    PROGRAMS: ("stu_tracker.Programs", ["program_name"]),
+    SUBJECTS: ("stu_tracker.Subjects", ["title"]),
+}
+
+DIMENSION_TTL_SECONDS = float(os.getenv("DIMENSION_TTL_SECONDS", 600))
+DIMENSION_MAX_ENTRIES = int(os.getenv("DIMENSION_MAX_ENTRIES", 50000))
+
+
+class DimensionCache:
+    """
+        Worker side cache of the small, slowly changing tables every report used
+        to join. Rows are cached per id with a TTL and evicted least recently used
+        first; misses are loaded in one query per table and attached to the fact
+        rows with a vectorized map instead of a database join. Job threads share
+        one cache through using(), each loading its misses on its own connection.
+    """
+
+    def __init__(self, db, ttl=DIMENSION_TTL_SECONDS, max_entries=DIMENSION_MAX_ENTRIES):
+        self.db = db
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {name: OrderedDict() for name in TABLES}
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0}
+
+    @property
+    def hits(self) -> int:
+        return self._counts["hits"]
+
+    @property
+    def misses(self) -> int:
+        return self._counts["misses"]
+
+    def using(self, db):
+        """This cache loading its misses through db; entries, lock and counters stay shared."""
+        view = copy.copy(self)
+        view.db = db
+        return view
+
+    def lookup(self, name, ids) -> pd.DataFrame:
+        """Returns the cached columns of table name for ids, indexed by id."""
+        table, columns = TABLES[name]
+        wanted = {int(i) for i in pd.unique(pd.Series(ids).dropna())}
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            entries = self._entries[name]
+            for key in wanted:
+                entry = entries.get(key)
+                if entry is not None and now - entry[0] < self.ttl:
+                    entries.move_to_end(key)
+                    found[key] = entry[1]
+            self._counts["hits"] += len(found)
+
+        missing = sorted(wanted - found.keys())
+        if missing:
+            query = f"SELECT id, {', '.join(columns)} FROM {table} WHERE id = ANY(%s)"
+            rows = self.db.fetch_all(query, (missing,)) or []
+            loaded = {row["id"]: tuple(row[c] for c in columns) for row in rows}
+            with self._lock:
+                self._counts["misses"] += len(missing)
+                entries = self._entries[name]
+                for key, values in loaded.items():
+                    entries[key] = (now, values)
+                    entries.move_to_end(key)
+                while len(entries) > self.max_entries:
+                    entries.popitem(last=False)
+            found.update(loaded)
+
+        return pd.DataFrame.from_dict(found, orient="index", columns=columns)
+
+    def attach(self, frame: pd.DataFrame, name, on, rename=None) -> pd.DataFrame:
+        """
+            Adds the cached columns of table name to frame, matched on frame[on].
+            Ids without a row get NaN, like the LEFT JOIN they replace.
+        """
+        rename = rename or {}
+        keys = frame[on]
+        dims = self.lookup(name, keys)
+        if keys.dtype.kind == "f":
+            dims.index = dims.index.astype(keys.dtype)
+        for column in TABLES[name][1]:
+            frame[rename.get(column, column)] = keys.map(dims[column])
+        return frame
+
+    def invalidate(self, name=None):
+        with self._lock:
+            for key in ([name] if name else list(self._entries)):
+                self._entries[key].clear()
@@ -0,0 +1,86 @@
+import os
+import logging
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# Schedule buffered jobs round robin across location_ids instead of FIFO
+FAIR_SCHEDULING = os.getenv("FAIR_SCHEDULING") == "1"
+# Messages held locally on top of the running jobs, so there is something to choose from
+FAIR_BUFFER_SIZE = int(os.getenv("FAIR_BUFFER_SIZE", 20))
+# Comma separated location_id:weight pairs, e.g. "12:3,40:0.5"
+FAIR_WEIGHTS = os.getenv("FAIR_WEIGHTS", "")
+FAIR_DEFAULT_WEIGHT = float(os.getenv("FAIR_DEFAULT_WEIGHT", 1))
+
+
+def parse_weights(value):
+    weights = {}
+    for pair in (value or "").split(","):
+        if not pair.strip():
+            continue
+        try:
+            tenant, weight = pair.split(":")
+            weights[str(tenant.strip())] = float(weight)
+        except ValueError:
+            logger.warning(f"Ignoring malformed FAIR_WEIGHTS entry {pair!r}")
+    return weights
+
+
+class FairScheduler:
+    """
+        Buffers jobs per tenant (location_id) and hands them out in smooth
+        weighted round robin order: a tenant with weight 2 gets two jobs for
+        every one of a weight 1 tenant while both have jobs waiting, and a
+        tenant with a single report never waits behind another's backlog.
+        Jobs of one tenant keep their arrival order.
+    """
+
+    def __init__(self, weights=None, default_weight=FAIR_DEFAULT_WEIGHT):
+        self.weights = parse_weights(FAIR_WEIGHTS) if weights is None else {str(k): v for k, v in weights.items()}
+        self.default_weight = default_weight
+        # tenant: deque of jobs, in order of first arrival
+        self._queues = OrderedDict()
+        self._current = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    def weight(self, tenant) -> float:
+        return max(self.weights.get(str(tenant), self.default_weight), 0.001)
+
+    def push(self, tenant, job):
+        tenant = str(tenant)
+        if tenant not in self._queues:
+            self._queues[tenant] = deque()
+            self._current[tenant] = 0.0
+        self._queues[tenant].append(job)
+        self._size += 1
+
+    def pop(self):
+        """Returns (tenant, job) of the next job to run; raises IndexError when empty."""
+        if not self._size:
+            raise IndexError("pop from an empty FairScheduler")
+        total = 0.0
+        chosen = None
+        for tenant in self._queues:
+            weight = self.weight(tenant)
+            self._current[tenant] += weight
+            total += weight
+            if chosen is None or self._current[tenant] > self._current[chosen]:
+                chosen = tenant
+        self._current[chosen] -= total
+        queue = self._queues[chosen]
+        job = queue.popleft()
+        self._size -= 1
+        if not queue:
+            # An idle tenant does not bank credit for its next burst
+            del self._queues[chosen]
+            del self._current[chosen]
+        return chosen, job
+
+    def depths(self) -> dict:
+        return {tenant: len(queue) for tenant, queue in self._queues.items()}
@@ -0,0 +1,229 @@
+import json
+import logging
+import datetime
+from dataclasses import dataclass
+from typing import Optional
+from Parser.Attendance import DAILY, LAYOUTS
+from Parser.TutorParser import GROUP_TUTORS
+from Parser.StudentParser import SESSIONS, ASSESSMENTS, GROUP_STUDENTS, ALL
+
+try:
+    import orjson
+    loads = orjson.loads
+    DecodeError = orjson.JSONDecodeError
+except ImportError:
+    loads = json.loads
+    DecodeError = json.JSONDecodeError
+
+logger = logging.getLogger(__name__)
+
+TUTOR = "tutor"
+STUDENT = "student"
+# Go's zero time.Time, sent for dates the user left empty
+ZERO_DATE = datetime.date(1, 1, 1)
+
+# entity: {data_type: sort_keys}; tutor reports ignore data_type
+REPORTS = {
+    TUTOR: {None: (GROUP_TUTORS, ALL)},
+    STUDENT: {SESSIONS: (GROUP_STUDENTS, ALL), ASSESSMENTS: (GROUP_STUDENTS, ALL)},
+}
+
+
+class InvalidJob(ValueError):
+    """A payload that can't produce a report; rejected before any query runs."""
+
+
+def _id(body, name) -> Optional[int]:
+    value = body.get(name)
+    if value is None or value == "" or value == ALL:
+        return None
+    if isinstance(value, bool):
+        raise InvalidJob(f"{name} must be an integer, got {value!r}")
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise InvalidJob(f"{name} must be an integer, got {value!r}") from None
+    if number != value and str(number) != str(value).strip():
+        raise InvalidJob(f"{name} must be an integer, got {value!r}")
+    return number
+
+
+def _date(body, name) -> Optional[datetime.date]:
+    value = body.get(name)
+    if value is None or value == "":
+        return None
+    if not isinstance(value, str):
+        raise InvalidJob(f"{name} must be an ISO 8601 date, got {value!r}")
+    try:
+        # The date as written, like Postgres' DATE('2025-01-06T00:00:00Z')
+        parsed = datetime.date.fromisoformat(value[:10])
+        if len(value) > 10:
+            datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidJob(f"{name} must be an ISO 8601 date, got {value!r}") from None
+    return None if parsed == ZERO_DATE else parsed
+
+
+def _text(body, name) -> Optional[str]:
+    value = body.get(name)
+    if value is None or value == "":
+        return None
+    if not isinstance(value, str):
+        raise InvalidJob(f"{name} must be a string, got {value!r}")
+    return value
+
+
+def _report(body, where=""):
+    """Validates (entity, data_type, sort_key, layout) of a job or bundle output."""
+    entity, sort_key = _text(body, "entity"), _text(body, "sort_key")
+    # Tutor reports have no data_type, whatever the producer sends is ignored as before
+    data_type = None if entity == TUTOR else _text(body, "data_type")
+    layout = _text(body, "layout") or DAILY
+    if entity not in REPORTS:
+        raise InvalidJob(f"{where}entity must be one of {sorted(REPORTS)}, got {entity!r}")
+    data_types = REPORTS[entity]
+    if data_type not in data_types:
+        raise InvalidJob(f"{where}data_type of a {entity} report must be one of {[t for t in data_types if t]}, got {data_type!r}")
+    if sort_key not in data_types[data_type]:
+        raise InvalidJob(f"{where}sort_key of a {entity} {data_type or ''} report must be one of {list(data_types[data_type])}, got {sort_key!r}")
+    if layout not in LAYOUTS:
+        raise InvalidJob(f"{where}layout must be one of {list(LAYOUTS)}, got {layout!r}")
+    return entity, data_type, sort_key, layout
+
+
+def report_keys(body) -> list:
+    """
+        The s3_output_keys named by a payload, read as leniently as possible so
+        the report rows of a rejected job can still be marked FAILED.
+    """
+    try:
+        data = loads(body)
+    except (DecodeError, UnicodeDecodeError):
+        return []
+    if not isinstance(data, dict):
+        return []
+    outputs = data.get("outputs")
+    items = [data] + (outputs if isinstance(outputs, list) else [])
+    return [
+        item["s3_output_key"] for item in items
+        if isinstance(item, dict) and isinstance(item.get("s3_output_key"), str) and item["s3_output_key"]
+    ]
+
+
+@dataclass(frozen=True, slots=True)
+class Output:
+    """One file of a report bundle."""
+    entity: str
+    data_type: Optional[str]
+    sort_key: str
+    layout: str
+    s3_output_key: str
+
+    @classmethod
+    def from_dict(cls, body, index):
+        if not isinstance(body, dict):
+            raise InvalidJob(f"outputs[{index}] must be an object")
+        report = _report(body, f"outputs[{index}]: ")
+        key = _text(body, "s3_output_key")
+        if key is None:
+            raise InvalidJob(f"outputs[{index}]: s3_output_key is required")
+        return cls(*report, key)
+
+    def key(self) -> tuple:
+        return (self.entity, self.data_type, self.sort_key, self.layout)
+
+
+@dataclass(frozen=True, slots=True)
+class Job:
+    """
+        A report request decoded and validated once. Ids are ints, dates are
+        datetime.date (None when left empty), subject_id "all" means None.
+        Job.parse() raises InvalidJob for payloads that can't produce a report.
+    """
+    entity: Optional[str]
+    data_type: Optional[str]
+    sort_key: Optional[str]
+    layout: str
+    s3_output_key: Optional[str]
+    location_id: Optional[int] = None
+    program_id: Optional[int] = None
+    subject_id: Optional[int] = None
+    semester_id: Optional[int] = None
+    date_start: Optional[datetime.date] = None
+    date_end: Optional[datetime.date] = None
+    # Bundle of several outputs sharing the filters above
+    outputs: tuple = ()
+    # Upload the bundle as one zip at s3_output_key instead of one object per output
+    zip: bool = False
+    # Publish the first PREVIEW_ROWS rows at a sibling key before the full report
+    preview: bool = False
+
+    @classmethod
+    def parse(cls, body):
+        try:
+            data = loads(body)
+        except (DecodeError, UnicodeDecodeError) as e:
+            raise InvalidJob(f"payload is not valid JSON: {e}") from None
+        if not isinstance(data, dict):
+            raise InvalidJob("payload must be a JSON object")
+        return cls.from_dict(data)
+
+    @classmethod
+    def from_dict(cls, body):
+        raw_outputs = body.get("outputs") or []
+        if not isinstance(raw_outputs, list):
+            raise InvalidJob("outputs must be a list")
+        outputs = tuple(Output.from_dict(output, index) for index, output in enumerate(raw_outputs))
+        if outputs:
+            # The bundle's files carry the report kind, the top level only the filters
+            entity, data_type, sort_key = _text(body, "entity"), _text(body, "data_type"), _text(body, "sort_key")
+            layout = _text(body, "layout") or DAILY
+        else:
+            entity, data_type, sort_key, layout = _report(body)
+        job = cls(
+            entity=entity,
+            data_type=data_type,
+            sort_key=sort_key,
+            layout=layout,
+            s3_output_key=_text(body, "s3_output_key"),
+            location_id=_id(body, "location_id"),
+            program_id=_id(body, "program_id"),
+            subject_id=_id(body, "subject_id"),
+            semester_id=_id(body, "semester_id"),
+            date_start=_date(body, "date"),
+            date_end=_date(body, "date_end"),
+            outputs=outputs,
+            zip=bool(body.get("zip")),
+            preview=bool(body.get("preview")),
+        )
+        job.validate()
+        return job
+
+    def validate(self):
+        if self.s3_output_key is None and (not self.outputs or self.zip):
+            raise InvalidJob("s3_output_key is required")
+        if not self.has_filters():
+            # Would read every session of every organization
+            raise InvalidJob("at least one of location_id, program_id, semester_id, subject_id or date is required")
+        keys = [output.s3_output_key for output in self.outputs]
+        if len(set(keys)) != len(keys):
+            raise InvalidJob("outputs must have distinct s3_output_key values")
+        if self.date_start and self.date_end and self.date_end < self.date_start:
+            raise InvalidJob(f"date_end {self.date_end} is before date {self.date_start}")
+
+    def has_filters(self) -> bool:
+        return any(value is not None for value in (
+            self.location_id, self.program_id, self.semester_id, self.subject_id, self.date_start,
+        ))
+
+    def key(self) -> tuple:
+        """
+            Identifies the report content, whatever key it is uploaded to: equal
+            for two jobs that would produce the same files.
+        """
+        return (
+            self.entity, self.data_type, self.sort_key, self.layout,
+            self.location_id, self.program_id, self.subject_id, self.semester_id,
+            self.date_start, self.date_end,
+            tuple(output.key() for output in self.outputs), self.zip,
+        )
@@ -0,0 +1,102 @@
+import os
+import logging
+import datetime
+import threading
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+from Config.Spill import SpilledRows
+
+logger = logging.getLogger(__name__)
+
+# Connections a long date range is fetched on in parallel, 1 disables it
+PARALLEL_FETCH_PARTITIONS = int(os.getenv("PARALLEL_FETCH_PARTITIONS", 1))
+# Ranges shorter than this many days per partition are split less or not at all
+PARALLEL_FETCH_MIN_DAYS = int(os.getenv("PARALLEL_FETCH_MIN_DAYS", 7))
+
+EXPORT_SNAPSHOT = "SELECT pg_export_snapshot()"
+REPEATABLE_READ = "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"
+IMPORT_SNAPSHOT = "SET TRANSACTION SNAPSHOT %s"
+
+
+def parse_date(value):
+    """The date part of a payload date ("2024-01-31" or "2024-01-31T00:00:00Z")."""
+    try:
+        return datetime.date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def split_dates(start, end, partitions=PARALLEL_FETCH_PARTITIONS, min_days=PARALLEL_FETCH_MIN_DAYS):
+    """
+        Splits the inclusive range start..end into consecutive half open
+        [low, high) date ranges, oldest first. Returns a single range when
+        the span is too short to be worth splitting.
+    """
+    days = (end - start).days + 1
+    if days <= 0:
+        return []
+    count = max(1, min(partitions, days // max(min_days, 1)))
+    step, extra = divmod(days, count)
+    ranges = []
+    low = start
+    for index in range(count):
+        high = low + datetime.timedelta(days=step + (1 if index < extra else 0))
+        ranges.append((low, high))
+        low = high
+    return ranges
+
+
+def partition_query(query, params, column, low, high):
+    """Restricts a query that already has a WHERE clause to column in [low, high)."""
+    return f"{query} AND {column} >= %s AND {column} < %s", list(params) + [low, high]
+
+
+def merge(parts):
+    """Concatenates partition results in partition order, spilled or not."""
+    if not any(isinstance(part, SpilledRows) for part in parts):
+        # Grows the first part in place, each row list is dropped once moved
+        merged = parts[0]
+        for part in parts[1:]:
+            merged.extend(part)
+            part.clear()
+        return merged
+    merged = SpilledRows()
+    for part in parts:
+        if isinstance(part, SpilledRows):
+            merged.extend(part)
+        else:
+            merged.append(part)
+    return merged
+
+
+class PartitionPools:
+    """
+        Connection pools for partition reads, one per server, so the partitions
+        import the snapshot on the same host (primary or replica) that exported it.
+    """
+
+    def __init__(self, size=PARALLEL_FETCH_PARTITIONS):
+        self.size = max(size, 1)
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get(self, conn):
+        info = conn.info
+        key = (info.host, info.port, info.dbname, info.user)
+        with self._lock:
+            if key not in self._pools:
+                params = dict(info.dsn_parameters)
+                if info.password:
+                    params["password"] = info.password
+                self._pools[key] = ThreadedConnectionPool(0, self.size, **params)
+                logger.info(f"Created partition pool of {self.size} connections to {info.host}:{info.port}")
+            return self._pools[key]
+
+    def close(self):
+        with self._lock:
+            for pool in self._pools.values():
+                try:
+                    pool.closeall()
+                except psycopg2.Error as e:
+                    logger.warning(f"Failed to close partition pool: {e}")
+            self._pools = {}
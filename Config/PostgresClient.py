@@ -1,9 +1,19 @@
 import os
+import functools
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from psycopg2 import OperationalError, ProgrammingError, Error
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from Config.Spill import SpilledRows, estimate_row_bytes, should_spill, release
+from Config.Partitions import PartitionPools, split_dates, parse_date, partition_query, merge, REPEATABLE_READ, EXPORT_SNAPSHOT, IMPORT_SNAPSHOT
+from Config.Replicas import ReplicaPool
+from Config.SlowJobs import record_query
+from Config.Job import Job
+from Parser.TutorParser import GROUP_TUTORS
+from Parser.StudentParser import GROUP_STUDENTS
 import logging
+import time
 
 # --- 1. Set up basic logging to stdout ---
 logging.basicConfig(
@@ -13,9 +23,15 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 load_dotenv()
 
+FETCH_BATCH_SIZE = int(os.getenv("FETCH_BATCH_SIZE", 10000))
+
 class PostgresClient:
     def __init__(self):
         self.conn = None
+        # Report SELECTs go to these when POSTGRES_REPLICA_DSNS is set
+        self.replicas = ReplicaPool()
+        # Connections for fetching a date range in parallel partitions
+        self.partitions = PartitionPools()
         self._connect()
     
     def _connect(self):
@@ -42,38 +58,162 @@ class PostgresClient:
 
     def _get_cursor(self, cursor_factory=None):
         """Internal helper to get a cursor and handle potential connection issues."""
+        return self._get_primary().cursor(cursor_factory=cursor_factory)
+
+    def _get_primary(self):
+        """The read-write connection, reconnecting when it was closed."""
         if not self.conn or self.conn.closed:
             logger.warning("Database connection is closed. Attempting to reconnect...")
             self._connect()
-        return self.conn.cursor(cursor_factory=cursor_factory)
+        return self.conn
 
-    def fetch_one(self, query, params=None):
+    def _read(self, read, query, params):
+        """
+            Runs read(conn, query, params) on a healthy read replica when any is
+            configured and falls back to the primary, also when the replica
+            drops mid query. Writes never come through here.
+        """
+        replica, conn = self.replicas.acquire()
+        if conn is not None:
+            try:
+                return read(conn, query, params)
+            except OperationalError as e:
+                replica.mark_down(e.__class__.__name__)
+                logger.warning("Retrying read on the primary.")
+            except ProgrammingError as e:
+                # The query itself is wrong, the primary would reject it as well
+                logger.error(f"Failed to execute query: {query}")
+                logger.exception(e)
+                raise RuntimeError("Database query failed") from e
         try:
-            with self._get_cursor(cursor_factory=RealDictCursor) as cursor:
-                cursor.execute(query, params)
-                logger.debug(f"Executed query: {query} with params: {params}")
-                return cursor.fetchone()
+            return read(self._get_primary(), query, params)
         except (OperationalError, ProgrammingError) as e:
             logger.error(f"Failed to execute query: {query}")
             logger.exception(e)
             raise RuntimeError("Database query failed") from e
 
+    def fetch_one(self, query, params=None):
+        return self._read(self._fetch_one, query, params)
+
+    def _fetch_one(self, conn, query, params):
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(query, params)
+            logger.debug(f"Executed query: {query} with params: {params}")
+            return cursor.fetchone()
+
     def fetch_all(self, query, params=None):
+        """
+            Streams the result through a server side cursor in FETCH_BATCH_SIZE batches.
+            Returns a list of rows, or SpilledRows once the result grows past the
+            spill row/byte thresholds so large reports never sit in memory as dicts.
+        """
+        started = time.perf_counter()
+        data = self._read(self._fetch_all, query, params)
+        self._record(query, params, started, data)
+        return data
+
+    def fetch_all_partitioned(self, query, params, column, start, end):
+        """
+            fetch_all for a query restricted to the dates start..end, which must
+            already have a WHERE clause. The range is split on column into up to
+            PARALLEL_FETCH_PARTITIONS parts fetched on as many connections, all
+            reading one exported snapshot, and merged back oldest part first.
+        """
+        low, high = parse_date(start), parse_date(end)
+        ranges = split_dates(low, high, self.partitions.size) if low and high else []
+        if len(ranges) < 2:
+            return self.fetch_all(query, params)
+        started = time.perf_counter()
+        read = functools.partial(self._fetch_partitioned, column=column, ranges=ranges)
+        data = self._read(read, query, params)
+        self._record(query, params, started, data)
+        return data
+
+    def _record(self, query, params, started, data):
+        size = data.bytes if isinstance(data, SpilledRows) else estimate_row_bytes(data) * len(data)
+        record_query(query, params, time.perf_counter() - started, len(data), size)
+
+    def _fetch_partitioned(self, conn, query, params, column, ranges):
+        pool = self.partitions.get(conn)
+        workers = []
+        try:
+            # The snapshot stays importable while this transaction is open
+            conn.autocommit = False
+            with conn.cursor() as cursor:
+                cursor.execute(REPEATABLE_READ)
+                cursor.execute(EXPORT_SNAPSHOT)
+                snapshot = cursor.fetchone()[0]
+            workers = [pool.getconn() for _ in ranges]
+            with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="partition") as executor:
+                futures = [
+                    # Each part spills at its share of the thresholds, so together they stay under them
+                    executor.submit(self._fetch_all, worker, *partition_query(query, params, column, low, high), snapshot, len(ranges))
+                    for worker, (low, high) in zip(workers, ranges)
+                ]
+            errors = [future.exception() for future in futures if future.exception() is not None]
+            if errors:
+                release(*(future.result() for future in futures if future.exception() is None))
+                raise errors[0]
+            logger.debug(f"Fetched {len(ranges)} partitions of {column} on snapshot {snapshot}")
+            return merge([future.result() for future in futures])
+        finally:
+            for worker in workers:
+                pool.putconn(worker, close=worker.closed)
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                    conn.autocommit = True
+                except Error as e:
+                    logger.warning(f"Failed to end snapshot transaction: {e}")
+
+    def _fetch_all(self, conn, query, params, snapshot=None, parts=1):
+        rows = []
+        spilled = None
+        row_bytes = None
         try:
-            with self._get_cursor(cursor_factory=RealDictCursor) as cursor:
+            # Named cursors need a transaction, the read is rolled back once drained
+            conn.autocommit = False
+            if snapshot is not None:
+                with conn.cursor() as cursor:
+                    cursor.execute(REPEATABLE_READ)
+                    cursor.execute(IMPORT_SNAPSHOT, (snapshot,))
+            with conn.cursor(name="fetch_all", cursor_factory=RealDictCursor) as cursor:
+                cursor.itersize = FETCH_BATCH_SIZE
                 cursor.execute(query, params)
                 logger.debug(f"Executed query: {query} with params: {params}")
-                return cursor.fetchall()
-        except (OperationalError, ProgrammingError) as e:
-            logger.error(f"Failed to execute query: {query}")
-            logger.exception(e)
-            raise RuntimeError("Database query failed") from e
+                while True:
+                    batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+                    if not batch:
+                        break
+                    if spilled is not None:
+                        spilled.append(batch)
+                        continue
+                    rows.extend(batch)
+                    if row_bytes is None:
+                        row_bytes = estimate_row_bytes(batch)
+                    if should_spill(len(rows), row_bytes, parts):
+                        spilled = SpilledRows()
+                        for start in range(0, len(rows), FETCH_BATCH_SIZE):
+                            spilled.append(rows[start:start + FETCH_BATCH_SIZE])
+                        rows = []
+        except Error:
+            if spilled is not None:
+                spilled.close()
+            raise
+        finally:
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                    conn.autocommit = True
+                except Error as e:
+                    logger.warning(f"Failed to end read transaction: {e}")
+        return spilled if spilled is not None else rows
 
     def execute(self, query, params=None):
         try:
             with self._get_cursor() as cursor:
                 cursor.execute(query, params)
-                logger.info(f"Executed command: {query} with params: {params}")
+                logger.debug(f"Executed command: {query} with params: {params}")
         except (OperationalError, ProgrammingError) as e:
             logger.error(f"Failed to execute command: {query}")
             logger.exception(e)
@@ -86,7 +226,26 @@ class PostgresClient:
         "UPDATE stu_tracker.Organization_report SET status = %s, retry_count = %s WHERE s3_output_key = %s;"
         self.execute(query, params)
 
-    def get_tutor_file_data(self, params: dict):
+    def update_preview_status(self, params):
+        query = "" \
+        "UPDATE stu_tracker.Organization_report SET preview_status = %s WHERE s3_output_key = %s;"
+        self.execute(query, params)
+
+    @staticmethod
+    def _preview_query(query, args, limit, entity=None, order=()):
+        """
+            Limits a filtered report query to its first limit rows in order, or
+            with entity (the tutor or student id of a grouped report) to every
+            row of its first limit entities, so their totals are complete.
+        """
+        source = " ".join(query[next(i for i, part in enumerate(query) if part.startswith("FROM")):])
+        qu = " ".join(query)
+        if entity is None:
+            return f"{qu} ORDER BY {', '.join(order)} LIMIT %s", args + [int(limit)]
+        qu += f" AND {entity} IN (SELECT DISTINCT {entity} {source} ORDER BY {entity} LIMIT %s)"
+        return f"{qu} ORDER BY {', '.join((entity,) + order)}", args + args + [int(limit)]
+
+    def get_tutor_file_data(self, job: Job, limit=None):
         query = [
             "SELECT "
             "ss.id AS session_id,",
@@ -97,40 +256,38 @@ class PostgresClient:
             "ss.start_time,",
             "ss.duration,",
             "ss.notes,",
-            "t.first_name,",
-            "t.last_name,",
-            "pg.program_name,",
-            "pg.id AS program_id",
+            # Tutor and program names are attached from the DimensionCache
+            "ss.program_id",
             "FROM stu_tracker.Sessions ss",
-            "LEFT JOIN stu_tracker.Tutors t ON t.id = ss.tutor_id",
-            "LEFT JOIN stu_tracker.Programs pg ON pg.id = ss.program_id",
         ]
         args = []
         conditions = []
-        if params.get("location_id"):
+        date_range = None
+        if job.location_id is not None:
             conditions.append("ss.location_id = %s")
-            args.append(int(params.get("location_id")))
+            args.append(job.location_id)
         
-        if params.get("program_id"):
+        if job.program_id is not None:
             conditions.append("ss.program_id = %s")
-            args.append(int(params.get("program_id")))
+            args.append(job.program_id)
         
-        if params.get("semester_id"):
+        if job.semester_id is not None:
             conditions.append("ss.semester_id = %s")
-            args.append(int(params.get("semester_id")))
+            args.append(job.semester_id)
         
-        if params.get("date") != "0001-01-01T00:00:00Z" and params.get("date_end") != "0001-01-01T00:00:00Z":
+        if job.date_start is not None and job.date_end is not None:
             conditions.append("DATE(ss.session_date) BETWEEN %s AND %s")
-            args.append(params.get("date"))
-            args.append(params.get("date_end"))
+            args.append(job.date_start)
+            args.append(job.date_end)
+            date_range = (job.date_start, job.date_end)
         
-        elif params.get("date") != "0001-01-01T00:00:00Z":
+        elif job.date_start is not None:
             conditions.append("DATE(ss.session_date) >= %s")
-            args.append(params.get("date"))
+            args.append(job.date_start)
 
-        if params.get("subject_id"):
+        if job.subject_id is not None:
             conditions.append("ss.subject_id = %s")
-            args.append(params.get("subject_id"))
+            args.append(job.subject_id)
         
         qu = None
         if len(conditions) > 0:
@@ -140,12 +297,21 @@ class PostgresClient:
         else:
             return None
             
-        data = self.fetch_all(qu, args)
+        if limit is not None:
+            # Grouped previews keep whole tutors or students, not their first rows
+            entity = "ss.tutor_id" if job.sort_key == GROUP_TUTORS else None
+            qu, args = self._preview_query(query, args, limit, entity, ("ss.session_date", "ss.id"))
+        if date_range is None or limit is not None:
+            data = self.fetch_all(qu, args)
+        else:
+            data = self.fetch_all_partitioned(qu, args, "ss.session_date", *date_range)
         if not data:
             return None
+        if isinstance(data, SpilledRows):
+            return data
         return [dict(row) for row in data]
 
-    def get_student_assessments(self, params: dict):
+    def get_student_assessments(self, job: Job, limit=None):
         query = [
             "SELECT",
             "a.title AS assessment_title, ",
@@ -162,61 +328,66 @@ class PostgresClient:
             "ss.last_name,",
             "ss.id,",
             "ast.session_id,",
-            "ast.subject_id,",
-            "sj.title AS subject_title",
+            # Subject titles are attached from the DimensionCache
+            "ast.subject_id",
             "FROM stu_tracker.Assessments_students ast",
             "JOIN stu_tracker.Students ss ON ss.id = ast.student_id",
             "LEFT JOIN stu_tracker.Assessments a ON a.id = ast.assessment_id",
             "JOIN stu_tracker.Sessions sn ON sn.id = ast.session_id",
-            "LEFT JOIN stu_tracker.Subjects sj ON sj.id = ast.subject_id",
             ""
         ]
         args = []
         conditions = []
-        if params.get("location_id"):
+        date_range = None
+        if job.location_id is not None:
             conditions.append("sn.location_id = %s")
-            args.append(int(params.get("location_id")))
+            args.append(job.location_id)
         
-        if params.get("program_id"):
+        if job.program_id is not None:
             conditions.append("sn.program_id = %s")
-            args.append(int(params.get("program_id")))
+            args.append(job.program_id)
         
-        if params.get("semester_id"):
+        if job.semester_id is not None:
             conditions.append("sn.semester_id = %s")
-            args.append(int(params.get("semester_id")))
+            args.append(job.semester_id)
         
-        if params.get("date") != "0001-01-01T00:00:00Z" and params.get("date_end") != "0001-01-01T00:00:00Z":
+        if job.date_start is not None and job.date_end is not None:
             conditions.append("DATE(sn.session_date) BETWEEN %s AND %s")
-            args.append(params.get("date"))
-            args.append(params.get("date_end"))
+            args.append(job.date_start)
+            args.append(job.date_end)
+            date_range = (job.date_start, job.date_end)
         
-        elif params.get("date") != "0001-01-01T00:00:00Z":
+        elif job.date_start is not None:
             conditions.append("DATE(sn.session_date) >= %s")
-            args.append(params.get("date"))
+            args.append(job.date_start)
 
-        if params.get("subject_id") and params.get("subject_id") != "all":
+        if job.subject_id is not None:
             conditions.append("ast.subject_id = %s")
-            args.append(params.get("subject_id"))
+            args.append(job.subject_id)
         
         qu = None
         if len(conditions) > 0:
             query.append("WHERE")
             query.append(" AND ".join(conditions))
             qu = " ".join(query)
-            
         else:
-            qu = " ".join(query)
-        
-        print(qu)
-        if qu is None:
             return None
-
-        data = self.fetch_all(qu, args)
+            
+        if limit is not None:
+            # Grouped previews keep whole tutors or students, not their first rows
+            entity = "ss.id" if job.sort_key == GROUP_STUDENTS else None
+            qu, args = self._preview_query(query, args, limit, entity, ("sn.session_date", "ast.session_id"))
+        if date_range is None or limit is not None:
+            data = self.fetch_all(qu, args)
+        else:
+            data = self.fetch_all_partitioned(qu, args, "sn.session_date", *date_range)
         if not data:
             return None
+        if isinstance(data, SpilledRows):
+            return data
         return [dict(row) for row in data]
 
-    def get_student_sessions(self, params: dict):
+    def get_student_sessions(self, job: Job, limit=None):
         query = [
             "SELECT ",
             "s.id,",  
@@ -230,43 +401,41 @@ class PostgresClient:
             "s.timeframe,",
             "s.timeframe_start,",
             "s.timeframe_end,",
-            "CASE ",
-            "       WHEN ss.subject_id IS NULL THEN 'NA'",
-            "       ELSE sj.title",
-            "END AS subject,",
-            "program_name",
+            # Subject titles and program names are attached from the DimensionCache
+            "ss.subject_id,",
+            "st.program_id",
             "FROM stu_tracker.Students s",
             "JOIN stu_tracker.Session_students ss ON s.id = ss.student_id",
             "JOIN stu_tracker.Sessions st ON st.id = ss.session_id",
-            "LEFT JOIN stu_tracker.Subjects sj ON sj.id = ss.subject_id",
-            "LEFT JOIN stu_tracker.Programs pg ON pg.id = st.program_id",
         ]
         args = []
         conditions = []
-        if params.get("location_id"):
+        date_range = None
+        if job.location_id is not None:
             conditions.append("st.location_id = %s")
-            args.append(int(params.get("location_id")))
+            args.append(job.location_id)
         
-        if params.get("program_id"):
+        if job.program_id is not None:
             conditions.append("st.program_id = %s")
-            args.append(int(params.get("program_id")))
+            args.append(job.program_id)
         
-        if params.get("semester_id"):
+        if job.semester_id is not None:
             conditions.append("st.semester_id = %s")
-            args.append(int(params.get("semester_id")))
+            args.append(job.semester_id)
         
-        if params.get("date") != "0001-01-01T00:00:00Z" and params.get("date_end") != "0001-01-01T00:00:00Z":
+        if job.date_start is not None and job.date_end is not None:
             conditions.append("DATE(st.session_date) BETWEEN %s AND %s")
-            args.append(params.get("date"))
-            args.append(params.get("date_end"))
+            args.append(job.date_start)
+            args.append(job.date_end)
+            date_range = (job.date_start, job.date_end)
         
-        elif params.get("date") != "0001-01-01T00:00:00Z":
+        elif job.date_start is not None:
             conditions.append("DATE(st.session_date) >= %s")
-            args.append(params.get("date"))
+            args.append(job.date_start)
 
-        if params.get("subject_id") and params.get("subject") != "all":
+        if job.subject_id is not None:
             conditions.append("ss.subject_id = %s")
-            args.append(params.get("subject_id"))
+            args.append(job.subject_id)
         
         qu = None
         if len(conditions) > 0:
@@ -274,19 +443,26 @@ class PostgresClient:
             query.append(" AND ".join(conditions))
             qu = " ".join(query)
         else:
-            qu = " ".join(query)
-        
-        print(qu)
-        if qu is None:
             return None
-
-        data = self.fetch_all(qu, args)
+            
+        if limit is not None:
+            # Grouped previews keep whole tutors or students, not their first rows
+            entity = "s.id" if job.sort_key == GROUP_STUDENTS else None
+            qu, args = self._preview_query(query, args, limit, entity, ("st.session_date", "ss.id"))
+        if date_range is None or limit is not None:
+            data = self.fetch_all(qu, args)
+        else:
+            data = self.fetch_all_partitioned(qu, args, "st.session_date", *date_range)
         if not data:
             return None
+        if isinstance(data, SpilledRows):
+            return data
         return [dict(row) for row in data]
     
                 
     def close(self):
+        self.replicas.close()
+        self.partitions.close()
         if self.conn and not self.conn.closed:
             self.conn.close()
             logger.info("PostgreSQL connection closed.")
\ No newline at end of file
@@ -5,6 +5,7 @@ import pika
 from dotenv import load_dotenv
 import boto3
 import ssl
+import functools
 
 load_dotenv()  # loads variables from .env
 
@@ -37,6 +38,9 @@ class RabbitMQ:
             logger.info(f"Attempting to connect to RabbitMQ at host: {RABBITMQ_HOST}:{RABBITMQ_PORT}")
             params = None
             self.queue = queue
+            self.callback = None
+            self.consumer_tag = None
+            self.prefetch_count = prefetch_count
             if RABBIT_LOCAL == str(1) or RABBIT_LOCAL == 1:
                 params = pika.ConnectionParameters(
                     host=RABBITMQ_HOST, 
@@ -73,10 +77,60 @@ class RabbitMQ:
 
 
     def set_callback(self, callback_):
-        self.channel.basic_consume(queue=self.queue, on_message_callback=callback_)
+        self.callback = callback_
+        self.consumer_tag = self.channel.basic_consume(queue=self.queue, on_message_callback=callback_)
+
+    def pause(self):
+        """Stops new deliveries; unacked messages stay with this consumer."""
+        if self.consumer_tag is not None:
+            self.channel.basic_cancel(self.consumer_tag)
+            self.consumer_tag = None
+            logger.info(f"Paused consuming from '{self.queue}'.")
+
+    def resume(self):
+        if self.consumer_tag is None and self.callback is not None:
+            self.consumer_tag = self.channel.basic_consume(queue=self.queue, on_message_callback=self.callback)
+            logger.info(f"Resumed consuming from '{self.queue}'.")
+
+    def is_paused(self) -> bool:
+        return self.consumer_tag is None
+
+    def set_prefetch(self, prefetch_count):
+        if prefetch_count != self.prefetch_count:
+            self.channel.basic_qos(prefetch_count=prefetch_count)
+            self.prefetch_count = prefetch_count
+
+    def queue_depth(self) -> int:
+        """Messages ready in the queue, not counting the ones delivered to consumers."""
+        return self.channel.queue_declare(queue=self.queue, durable=True, passive=True).method.message_count
 
     def get_connection(self)->pika.BlockingConnection:
         return self.connection
         
     def get_channel(self):
-        return self.channel
\ No newline at end of file
+        return self.channel
+
+
+class ThreadSafeChannel:
+    """
+        Hands ack/nack calls made from a job thread to the connection's own
+        thread, the only one allowed to use a pika BlockingConnection.
+        One instance per job; settled tells whether the job answered its message.
+    """
+
+    def __init__(self, connection, channel):
+        self.connection = connection
+        self.channel = channel
+        self.settled = False
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self.settled = True
+        self.connection.add_callback_threadsafe(
+            functools.partial(self.channel.basic_ack, delivery_tag=delivery_tag, multiple=multiple)
+        )
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        self.settled = True
+        self.connection.add_callback_threadsafe(
+            functools.partial(self.channel.basic_nack, delivery_tag=delivery_tag, multiple=multiple, requeue=requeue)
+        )
@@ -0,0 +1,114 @@
+import os
+import re
+import time
+import logging
+import itertools
+import threading
+import psycopg2
+from psycopg2 import Error
+
+logger = logging.getLogger(__name__)
+
+# Comma separated libpq DSNs or postgresql:// URIs of the read replicas
+POSTGRES_REPLICA_DSNS = os.getenv("POSTGRES_REPLICA_DSNS", "")
+POSTGRES_REPLICA_MAX_LAG_SECONDS = float(os.getenv("POSTGRES_REPLICA_MAX_LAG_SECONDS", 30))
+POSTGRES_REPLICA_LAG_CHECK_SECONDS = float(os.getenv("POSTGRES_REPLICA_LAG_CHECK_SECONDS", 5))
+POSTGRES_REPLICA_RETRY_SECONDS = float(os.getenv("POSTGRES_REPLICA_RETRY_SECONDS", 30))
+
+LAG_QUERY = (
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "END"
+)
+
+
+def parse_dsns(value):
+    return [dsn.strip() for dsn in re.split(r",|\n", value or "") if dsn.strip()]
+
+
+def redact(dsn):
+    dsn = re.sub(r"password=\S+", "password=***", dsn)
+    return re.sub(r"(://[^:/@]+):[^@]*@", r"\1:***@", dsn)
+
+
+class Replica:
+    def __init__(self, dsn):
+        self.dsn = dsn
+        self.name = redact(dsn)
+        self.conn = None
+        self.lag = None
+        self.checked_at = 0.0
+        self.down_until = 0.0
+
+    def connect(self):
+        if self.conn is None or self.conn.closed:
+            self.conn = psycopg2.connect(self.dsn)
+            self.conn.autocommit = True
+            logger.info(f"Connected to read replica {self.name}")
+        return self.conn
+
+    def mark_down(self, reason):
+        self.down_until = time.monotonic() + POSTGRES_REPLICA_RETRY_SECONDS
+        logger.warning(f"Read replica {self.name} unavailable ({reason}), using other hosts for {POSTGRES_REPLICA_RETRY_SECONDS:.0f}s")
+        self.close()
+
+    def close(self):
+        if self.conn is not None and not self.conn.closed:
+            self.conn.close()
+        self.conn = None
+
+
+class ReplicaPool:
+    """
+        Picks a read replica for report SELECTs in round robin order. A replica
+        that cannot be reached or lags more than max_lag seconds is skipped;
+        when none qualifies, acquire() returns None and the caller reads from
+        the primary.
+    """
+
+    def __init__(self, dsns=None, max_lag=POSTGRES_REPLICA_MAX_LAG_SECONDS, lag_check=POSTGRES_REPLICA_LAG_CHECK_SECONDS):
+        if dsns is None:
+            dsns = parse_dsns(POSTGRES_REPLICA_DSNS)
+        self.replicas = [Replica(dsn) for dsn in dsns]
+        self.max_lag = max_lag
+        self.lag_check = lag_check
+        self._order = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def _lag(self, replica, now):
+        if replica.lag is None or now - replica.checked_at >= self.lag_check:
+            with replica.connect().cursor() as cursor:
+                cursor.execute(LAG_QUERY)
+                replica.lag = float(cursor.fetchone()[0])
+            replica.checked_at = now
+        return replica.lag
+
+    def acquire(self):
+        """Returns (replica, connection) of a healthy replica or (None, None)."""
+        if not self.replicas:
+            return None, None
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = self.replicas[next(self._order)]
+                now = time.monotonic()
+                if now < replica.down_until:
+                    continue
+                try:
+                    lag = self._lag(replica, now)
+                except Error as e:
+                    replica.mark_down(e.__class__.__name__)
+                    continue
+                if lag > self.max_lag:
+                    logger.warning(f"Read replica {replica.name} is {lag:.1f}s behind, skipping")
+                    continue
+                return replica, replica.conn
+        return None, None
+
+    def close(self):
+        for replica in self.replicas:
+            replica.close()
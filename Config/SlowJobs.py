@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import logging
+import datetime
+import threading
+from contextlib import contextmanager
+from psycopg2 import Error
+
+logger = logging.getLogger(__name__)
+
+SLOW_JOB_SECONDS = float(os.getenv("SLOW_JOB_SECONDS", 60))
+# JSON lines file for slow job records, logged as a warning when unset
+SLOW_JOB_LOG = os.getenv("SLOW_JOB_LOG")
+SLOW_JOB_EXPLAIN = os.getenv("SLOW_JOB_EXPLAIN", "1") == "1"
+# EXPLAIN ANALYZE runs every query of the slow job again, so it has to be asked for
+SLOW_JOB_EXPLAIN_ANALYZE = os.getenv("SLOW_JOB_EXPLAIN_ANALYZE") == "1"
+
+_current = threading.local()
+# A record is shared with the upload threads of its job
+_record_lock = threading.Lock()
+# Every job thread has its own recorder, all appending to the same SLOW_JOB_LOG
+_write_lock = threading.Lock()
+
+
+def _record():
+    return getattr(_current, "record", None)
+
+
+@contextmanager
+def stage(name):
+    """Times a stage (query, parse, upload, ...) of the job running on this thread."""
+    record = _record()
+    if record is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        with _record_lock:
+            stages = record["stages"]
+            stages[name] = stages.get(name, 0.0) + elapsed
+
+
+def record_query(query, params, elapsed, rows, size):
+    """Called by PostgresClient for every fetch made while a job is recorded."""
+    record = _record()
+    if record is None:
+        return
+    with _record_lock:
+        record["queries"].append({
+            "sql": query,
+            "params": params,
+            "elapsed": elapsed,
+            "rows": rows,
+            "bytes": size,
+        })
+
+
+def note(key, value):
+    """Adds a counter (e.g. uploaded bytes) to the job running on this thread."""
+    record = _record()
+    if record is not None:
+        with _record_lock:
+            record["counters"][key] = record["counters"].get(key, 0) + value
+
+
+def bind(fn):
+    """
+        Wraps fn to record into the job of the calling thread, for work handed
+        to a thread pool (parallel uploads). Stage times of concurrent calls add up.
+    """
+    record = _record()
+
+    def bound(*args, **kwargs):
+        previous = _record()
+        _current.record = record
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.record = previous
+    return bound
+
+
+class SlowJobRecorder:
+    """
+        Records the SQL, per stage timings and row/byte counts of every job and
+        writes one JSON record, with the EXPLAIN plan of each query, for the
+        jobs slower than threshold seconds. Fast jobs are discarded. Plans are
+        estimates only unless analyze is set, which executes every query again.
+    """
+
+    def __init__(self, db, threshold=SLOW_JOB_SECONDS, path=SLOW_JOB_LOG, explain=SLOW_JOB_EXPLAIN, analyze=SLOW_JOB_EXPLAIN_ANALYZE):
+        self.db = db
+        self.threshold = threshold
+        self.path = path
+        self.explain = explain
+        self.analyze = analyze
+
+    @contextmanager
+    def job(self, body):
+        record = {
+            "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "payload": body.decode("utf-8", errors="replace") if isinstance(body, bytes) else body,
+            "stages": {},
+            "queries": [],
+            "counters": {},
+        }
+        _current.record = record
+        started = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record["error"] = repr(e)
+            raise
+        finally:
+            _current.record = None
+            record["elapsed"] = time.perf_counter() - started
+            if record["elapsed"] >= self.threshold:
+                self._write(record)
+
+    def _explain(self, query, params):
+        if not query.lstrip().upper().startswith("SELECT"):
+            return None
+        try:
+            options = "ANALYZE, BUFFERS, FORMAT JSON" if self.analyze else "FORMAT JSON"
+            row = self.db.fetch_one(f"EXPLAIN ({options}) " + query, params)
+            return row["QUERY PLAN"] if row else None
+        except (RuntimeError, Error) as e:
+            return {"error": repr(e.__cause__ or e)}
+
+    def _write(self, record):
+        record["threshold"] = self.threshold
+        if self.explain:
+            for query in record["queries"]:
+                query["plan"] = self._explain(query["sql"], query["params"])
+        line = json.dumps(record, default=str)
+        if not self.path:
+            logger.warning(f"Slow job: {line}")
+            return
+        with _write_lock:
+            with open(self.path, "a", encoding="utf-8") as out:
+                out.write(line + "\n")
+        logger.warning(f"Slow job took {record['elapsed']:.1f}s, recorded in {self.path}")
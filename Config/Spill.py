@@ -0,0 +1,135 @@
+import os
+import sys
+import shutil
+import logging
+import tempfile
+import weakref
+import pyarrow as pa
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SPILL_DIR = os.getenv("SPILL_DIR") or None
+SPILL_ROW_THRESHOLD = int(os.getenv("SPILL_ROW_THRESHOLD", 500000))
+SPILL_BYTE_THRESHOLD = int(os.getenv("SPILL_BYTE_THRESHOLD", 256 * 1024 * 1024))
+SAMPLE_ROWS = 100
+# Rows taken from the memory-mapped files per frame when reading them in another order
+SORT_BATCH_ROWS = 10000
+
+
+def estimate_row_bytes(rows) -> int:
+    """Rough in-memory size of one fetched row, sampled from the first rows."""
+    sample = rows[:SAMPLE_ROWS]
+    if not sample:
+        return 0
+    total = 0
+    for row in sample:
+        total += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+    return total // len(sample)
+
+
+def should_spill(row_count: int, row_bytes: int, parts: int = 1) -> bool:
+    """True past the thresholds, or past 1/parts of them for one of parts concurrent fetches."""
+    return row_count * parts > SPILL_ROW_THRESHOLD or row_count * row_bytes * parts > SPILL_BYTE_THRESHOLD
+
+
+class SpilledRows:
+    """
+        A fetched result set held in memory-mapped Arrow IPC files instead of
+        python objects, one file per fetched batch. Parsers read it back one
+        batch at a time through iter_frames().
+    """
+
+    def __init__(self, directory=SPILL_DIR):
+        self.directory = tempfile.mkdtemp(prefix="report-spill-", dir=directory)
+        self.paths = []
+        self.rows = 0
+        self.bytes = 0
+        # Remove the files even if the owner never calls close()
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.directory, True)
+        logger.info(f"Spilling fetched rows to {self.directory}")
+
+    def __len__(self):
+        return self.rows
+
+    def __bool__(self):
+        return self.rows > 0
+
+    def append(self, rows):
+        if not rows:
+            return
+        table = pa.Table.from_pylist([dict(row) for row in rows])
+        path = os.path.join(self.directory, f"{len(self.paths):06d}.arrow")
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        self.paths.append(path)
+        self.rows += table.num_rows
+        self.bytes += table.nbytes
+
+    def extend(self, other):
+        """Takes over the files of another SpilledRows, appended after our own."""
+        for source in other.paths:
+            path = os.path.join(self.directory, f"{len(self.paths):06d}.arrow")
+            shutil.move(source, path)
+            self.paths.append(path)
+        self.rows += other.rows
+        self.bytes += other.bytes
+        other.paths = []
+        other.close()
+
+    def iter_frames(self, columns=None):
+        for path in self.paths:
+            with pa.memory_map(path, "r") as source:
+                table = pa.ipc.open_file(source).read_all()
+                if columns is not None:
+                    table = table.select([c for c in columns if c in table.column_names])
+                yield table.to_pandas()
+
+    def table(self) -> pa.Table:
+        """Every batch as one memory-mapped table, without reading the rows."""
+        tables = [pa.ipc.open_file(pa.memory_map(path, "r")).read_all() for path in self.paths]
+        # A batch whose values were all NULL has null typed columns
+        return pa.concat_tables(tables, promote_options="default")
+
+    def iter_sorted_frames(self, column, batch_rows=SORT_BATCH_ROWS):
+        """
+            Yields the rows in the order of DataFrame.sort_values(by=column).
+            Only that column is loaded to compute the order, the rows are taken
+            from the memory-mapped files batch_rows at a time.
+        """
+        table = self.table()
+        order = table.column(column).to_pandas().sort_values().index.to_numpy()
+        for start in range(0, len(order), batch_rows):
+            yield table.take(order[start:start + batch_rows]).to_pandas()
+
+    def close(self):
+        self._finalizer()
+
+
+class ChunkedFrame:
+    """
+        A report too large to concatenate, produced one DataFrame at a time
+        from spilled rows. Every iteration calls chunks() again, so it can be
+        read more than once. S3.Csv.write_csv() streams it as one CSV.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    def __iter__(self):
+        return iter(self._chunks())
+
+
+def iter_frames(data, columns=None):
+    """Yields the rows of a fetch as DataFrames whether they were spilled or not."""
+    if isinstance(data, SpilledRows):
+        yield from data.iter_frames(columns)
+    else:
+        yield pd.DataFrame(data)
+
+
+def release(*datasets):
+    for data in datasets:
+        if isinstance(data, SpilledRows):
+            data.close()
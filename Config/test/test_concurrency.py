@@ -0,0 +1,108 @@
+# tests/test_concurrency.py
+import subprocess
+import sys
+import time
+
+from Config.Concurrency import (
+    ConcurrencyController, MB, cgroup_working_set_bytes, process_tree_rss_bytes, rss_bytes,
+)
+
+
+def _controller(**overrides):
+    settings = dict(min_jobs=1, max_jobs=10, memory_limit=1000 * MB, target_fraction=0.75,
+                    pause_fraction=0.9, job_estimate=100 * MB)
+    settings.update(overrides)
+    return ConcurrencyController(**settings)
+
+
+def test_limit_is_the_jobs_that_fit_in_the_headroom():
+    controller = _controller()
+
+    # 750MB target - 250MB used leaves room for five 100MB jobs
+    assert controller.decide(queue_depth=50, rss=250 * MB) == (5, False)
+    controller.job_started("a", rss=250 * MB)
+    controller.job_started("b", rss=250 * MB)
+    # Running jobs keep their slot on top of the headroom
+    assert controller.decide(queue_depth=50, rss=250 * MB) == (7, False)
+    assert controller.limit() == 7
+
+
+def test_measured_job_peaks_replace_the_estimate():
+    controller = _controller()
+    controller.job_started("a", rss=100 * MB)
+    controller.sample(rss=350 * MB)
+    controller.job_finished("a", rss=200 * MB)
+
+    assert controller.job_peak_estimate() == 250 * MB
+    assert controller.decide(queue_depth=50, rss=250 * MB) == (2, False)
+
+
+def test_pauses_above_the_pause_threshold():
+    controller = _controller()
+
+    assert controller.decide(queue_depth=50, rss=900 * MB) == (1, True)
+    assert controller.paused()
+    assert controller.decide(queue_depth=50, rss=899 * MB) == (1, False)
+
+
+def test_limit_is_capped_by_the_queue_depth():
+    controller = _controller()
+    controller.job_started("a", rss=0)
+
+    assert controller.decide(queue_depth=2, rss=0)[0] == 3
+
+
+def test_limit_is_clamped_to_min_and_max_jobs():
+    controller = _controller(min_jobs=2, max_jobs=4)
+
+    assert controller.decide(queue_depth=0, rss=0)[0] == 2
+    assert controller.decide(queue_depth=50, rss=700 * MB)[0] == 2
+    assert controller.decide(queue_depth=50, rss=0)[0] == 4
+
+
+def test_without_a_memory_limit_the_limit_is_max_jobs():
+    controller = _controller(memory_limit=0)
+
+    assert controller.decide(queue_depth=50, rss=10**12) == (10, False)
+
+
+def test_metrics_describe_the_last_decision():
+    controller = _controller()
+    controller.decide(queue_depth=50, rss=250 * MB)
+
+    metrics = controller.metrics()
+    assert metrics["limit"] == 5
+    assert metrics["rss_mb"] == 250.0
+    assert metrics["queue_depth"] == 50
+    assert metrics["decisions"] == 1
+
+
+def test_cgroup_working_set_leaves_out_reclaimable_cache(tmp_path, monkeypatch):
+    (tmp_path / "memory.current").write_text("900000000\n")
+    (tmp_path / "memory.stat").write_text("anon 500000000\ninactive_file 300000000\n")
+    monkeypatch.setattr("Config.Concurrency.CGROUP_USAGE", (
+        (str(tmp_path / "missing"), str(tmp_path / "missing.stat"), "total_inactive_file"),
+        (str(tmp_path / "memory.current"), str(tmp_path / "memory.stat"), "inactive_file"),
+    ))
+
+    assert cgroup_working_set_bytes() == 600000000
+    controller = ConcurrencyController(memory_limit=1000 * MB)
+    controller.cgroup = True
+    assert controller.usage() == 600000000
+
+
+def test_outside_a_cgroup_child_processes_are_counted():
+    # A CSV pool worker holding 64MB
+    child = subprocess.Popen(
+        [sys.executable, "-c", "import sys, time; data = b'x' * (64 << 20); print(flush=True); time.sleep(30)"],
+        stdout=subprocess.PIPE,
+    )
+    try:
+        child.stdout.readline()
+        deadline = time.monotonic() + 5
+        while process_tree_rss_bytes() - rss_bytes() < 60 * MB:
+            assert time.monotonic() < deadline, "child RSS was not counted"
+            time.sleep(0.05)
+    finally:
+        child.kill()
+        child.wait()
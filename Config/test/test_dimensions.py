@@ -0,0 +1,44 @@
+# tests/test_dimensions.py
+import threading
+
+import pandas as pd
+
+from Config.Dimensions import DimensionCache, TUTORS, PROGRAMS
+
+
+class FakeDimensionDB:
+    """Answers the DimensionCache lookups from fixed rows and counts the queries it gets."""
+    ROWS = {
+        "stu_tracker.Tutors": {1: {"first_name": "Ada", "last_name": "Lovelace"}},
+        "stu_tracker.Programs": {7: {"program_name": "Math Boost"}},
+        "stu_tracker.Subjects": {3: {"title": "Math"}},
+    }
+
+    def __init__(self):
+        self.queries = 0
+
+    def fetch_all(self, query, params=None):
+        self.queries += 1
+        table = query.split(" FROM ")[1].split(" ")[0]
+        return [dict(id=i, **self.ROWS[table][i]) for i in params[0] if i in self.ROWS[table]]
+
+
+def test_attach_maps_ids_and_leaves_unknown_ids_empty():
+    frame = pd.DataFrame({"tutor_id": [1, 2, 1]})
+    out = DimensionCache(FakeDimensionDB()).attach(frame, TUTORS, "tutor_id")
+
+    assert list(out["first_name"][[0, 2]]) == ["Ada", "Ada"]
+    assert pd.isna(out["first_name"][1])
+
+
+def test_threads_share_one_cache_through_their_own_connections():
+    shared = DimensionCache(None)
+    first, second = FakeDimensionDB(), FakeDimensionDB()
+
+    shared.using(first).lookup(PROGRAMS, [7])
+    thread = threading.Thread(target=shared.using(second).lookup, args=(PROGRAMS, [7]))
+    thread.start()
+    thread.join()
+
+    assert (first.queries, second.queries) == (1, 0)
+    assert (shared.hits, shared.misses) == (1, 1)
@@ -0,0 +1,53 @@
+# tests/test_fairness.py
+import pytest
+
+from Config.Fairness import FairScheduler, parse_weights
+
+
+def _drain(scheduler):
+    order = []
+    while scheduler:
+        order.append(scheduler.pop())
+    return order
+
+
+def test_small_tenant_does_not_wait_behind_a_backlog():
+    scheduler = FairScheduler(weights={})
+    for job in range(10):
+        scheduler.push(1, f"big-{job}")
+    scheduler.push(2, "small")
+
+    order = _drain(scheduler)
+
+    assert order.index(("2", "small")) == 1
+    # A tenant's own jobs keep their arrival order
+    assert [job for tenant, job in order if tenant == "1"] == [f"big-{job}" for job in range(10)]
+
+
+def test_weights_share_jobs_proportionally():
+    scheduler = FairScheduler(weights={"1": 3, "2": 1})
+    for job in range(12):
+        scheduler.push(1, job)
+        scheduler.push(2, job)
+
+    first = [tenant for tenant, _ in _drain(scheduler)][:8]
+
+    assert first.count("1") == 6
+    assert first.count("2") == 2
+
+
+def test_idle_tenant_does_not_bank_credit():
+    scheduler = FairScheduler(weights={})
+    scheduler.push(1, "a")
+    scheduler.pop()
+    scheduler.push(2, "b")
+    scheduler.push(2, "c")
+    scheduler.push(1, "d")
+
+    assert [tenant for tenant, _ in _drain(scheduler)] == ["2", "1", "2"]
+    with pytest.raises(IndexError):
+        scheduler.pop()
+
+
+def test_parse_weights_skips_malformed_pairs():
+    assert parse_weights("12:3, 40:0.5,bad,,7:x") == {"12": 3.0, "40": 0.5}
@@ -0,0 +1,98 @@
+# tests/test_job.py
+import datetime
+import json
+
+import pytest
+
+from Config.Job import Job, InvalidJob, report_keys
+
+
+def _body(**overrides):
+    payload = {
+        "entity": "student", "data_type": "Sessions", "sort_key": "group_students",
+        "location_id": "3", "semester_id": 7, "subject_id": "all",
+        "date": "2025-01-06T00:00:00Z", "date_end": "0001-01-01T00:00:00Z",
+        "s3_output_key": "org3/sessions.csv",
+    }
+    payload.update(overrides)
+    return json.dumps(payload).encode("utf-8")
+
+
+def test_parse_normalizes_ids_dates_and_layout():
+    job = Job.parse(_body())
+
+    assert job.location_id == 3
+    assert job.semester_id == 7
+    assert job.subject_id is None
+    assert job.date_start == datetime.date(2025, 1, 6)
+    assert job.date_end is None
+    assert job.layout == "daily"
+    with pytest.raises(AttributeError):
+        job.location_id = 4
+
+
+@pytest.mark.parametrize("overrides", [
+    {"entity": "teacher"},
+    {"entity": "tutor", "sort_key": "group_students"},
+    {"data_type": "Grades"},
+    {"sort_key": "group_tutors"},
+    {"layout": "yearly"},
+    {"location_id": "three"},
+    {"location_id": True},
+    {"date": "06/01/2025"},
+    {"date": "2025-02-01", "date_end": "2025-01-01"},
+    {"s3_output_key": None},
+    {"location_id": None, "semester_id": None, "subject_id": None, "date": None},
+    {"outputs": [{"entity": "student", "data_type": "Sessions", "sort_key": "all"}]},
+])
+def test_parse_rejects_invalid_jobs(overrides):
+    with pytest.raises(InvalidJob):
+        Job.parse(_body(**overrides))
+
+
+def test_parse_rejects_malformed_json():
+    with pytest.raises(InvalidJob):
+        Job.parse(b"{not json")
+    with pytest.raises(InvalidJob):
+        Job.parse(b"[]")
+
+
+def test_tutor_reports_ignore_data_type():
+    job = Job.parse(_body(entity="tutor", data_type="Assessments", sort_key="group_tutors"))
+
+    assert job.data_type is None
+    assert job.key() == Job.parse(_body(entity="tutor", data_type=None, sort_key="group_tutors")).key()
+
+
+def test_report_keys_of_rejected_payloads():
+    assert report_keys(_body(entity="teacher")) == ["org3/sessions.csv"]
+    assert report_keys(_body(s3_output_key=None, outputs=[{"s3_output_key": "org3/a.csv"}, "x", {}])) == ["org3/a.csv"]
+    assert report_keys(b"{not json") == []
+    assert report_keys(b"[]") == []
+
+
+def test_key_ignores_output_location_and_is_hashable():
+    first = Job.parse(_body())
+    second = Job.parse(_body(s3_output_key="org3/again.csv", location_id=3, subject_id=None))
+
+    assert first.key() == second.key()
+    assert len({first.key(), second.key(), Job.parse(_body(layout="weekly")).key()}) == 2
+
+
+def test_bundle_outputs_are_validated_individually():
+    job = Job.parse(_body(entity=None, data_type=None, sort_key=None, s3_output_key=None, outputs=[
+        {"entity": "tutor", "sort_key": "group_tutors", "s3_output_key": "org3/tutors.csv"},
+        {"entity": "student", "data_type": "Assessments", "sort_key": "all", "s3_output_key": "org3/a.csv"},
+    ]))
+
+    assert [output.s3_output_key for output in job.outputs] == ["org3/tutors.csv", "org3/a.csv"]
+    assert job.outputs[0].layout == "daily"
+    with pytest.raises(InvalidJob):
+        Job.parse(_body(outputs=[
+            {"entity": "tutor", "sort_key": "all", "s3_output_key": "org3/same.csv"},
+            {"entity": "student", "data_type": "Sessions", "sort_key": "all", "s3_output_key": "org3/same.csv"},
+        ]))
+    with pytest.raises(InvalidJob):
+        Job.parse(_body(zip=True, s3_output_key=None, outputs=[
+            {"entity": "tutor", "sort_key": "all", "s3_output_key": "org3/tutors.csv"},
+        ]))
@@ -0,0 +1,64 @@
+# tests/test_partitions.py
+import datetime
+
+from Config.Partitions import split_dates, partition_query, merge, parse_date
+from Config.Spill import SpilledRows, should_spill
+
+
+def test_split_dates_covers_range_without_overlap():
+    start, end = datetime.date(2025, 1, 1), datetime.date(2025, 3, 31)
+    ranges = split_dates(start, end, partitions=4, min_days=7)
+
+    assert len(ranges) == 4
+    assert ranges[0][0] == start
+    assert ranges[-1][1] == end + datetime.timedelta(days=1)
+    for (_, high), (low, _) in zip(ranges, ranges[1:]):
+        assert high == low
+    assert sum((high - low).days for low, high in ranges) == 90
+
+
+def test_split_dates_keeps_short_ranges_whole():
+    start = datetime.date(2025, 1, 1)
+    assert split_dates(start, start + datetime.timedelta(days=9), partitions=4, min_days=7) == [
+        (start, start + datetime.timedelta(days=10)),
+    ]
+    assert split_dates(start, start - datetime.timedelta(days=1), partitions=4) == []
+
+
+def test_partition_query_appends_half_open_bounds():
+    low, high = datetime.date(2025, 1, 1), datetime.date(2025, 2, 1)
+    query, params = partition_query("SELECT 1 FROM t WHERE a = %s", [5], "t.session_date", low, high)
+
+    assert query == "SELECT 1 FROM t WHERE a = %s AND t.session_date >= %s AND t.session_date < %s"
+    assert params == [5, low, high]
+    assert parse_date("2025-01-31T00:00:00Z") == datetime.date(2025, 1, 31)
+
+
+def test_merge_keeps_partition_order_across_spilled_parts():
+    spilled = SpilledRows()
+    spilled.append([{"id": 3}, {"id": 4}])
+
+    merged = merge([[{"id": 1}, {"id": 2}], spilled, [{"id": 5}]])
+
+    assert isinstance(merged, SpilledRows)
+    assert [row for frame in merged.iter_frames() for row in frame["id"].tolist()] == [1, 2, 3, 4, 5]
+    assert merge([[{"id": 1}], [], [{"id": 2}]]) == [{"id": 1}, {"id": 2}]
+    merged.close()
+
+
+def test_merge_extends_the_first_part_in_place():
+    first, second = [{"id": 1}], [{"id": 2}, {"id": 3}]
+    merged = merge([first, second])
+
+    assert merged is first
+    assert merged == [{"id": 1}, {"id": 2}, {"id": 3}]
+    assert second == []
+
+
+def test_partitions_spill_at_their_share_of_the_thresholds(monkeypatch):
+    monkeypatch.setattr("Config.Spill.SPILL_ROW_THRESHOLD", 1000)
+    monkeypatch.setattr("Config.Spill.SPILL_BYTE_THRESHOLD", 10**9)
+
+    assert not should_spill(300, 100)
+    assert not should_spill(250, 100, parts=4)
+    assert should_spill(300, 100, parts=4)
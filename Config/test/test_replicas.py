@@ -0,0 +1,147 @@
+# tests/test_replicas.py
+import pytest
+from psycopg2 import OperationalError, ProgrammingError
+
+from Config.Replicas import ReplicaPool
+from Config.PostgresClient import PostgresClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeConnection:
+    """Answers the lag query with the replication lag of its host."""
+
+    def __init__(self, dsn, lags):
+        self.dsn = dsn
+        self.lags = lags
+        self.closed = False
+        self.autocommit = False
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, query):
+                if connection.lags[connection.dsn] is None:
+                    raise OperationalError("server closed the connection unexpectedly")
+
+            def fetchone(self):
+                return (connection.lags[connection.dsn],)
+        return Cursor()
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr("Config.Replicas.time", clock)
+    return clock
+
+
+def _pool(monkeypatch, lags, **kwargs):
+    monkeypatch.setattr("Config.Replicas.psycopg2.connect", lambda dsn: FakeConnection(dsn, lags))
+    return ReplicaPool(list(lags), lag_check=0, **kwargs)
+
+
+def _picks(pool, count):
+    return [pool.acquire()[0].dsn for _ in range(count)]
+
+
+def test_acquire_goes_round_robin(monkeypatch, clock):
+    pool = _pool(monkeypatch, {"host=a": 0, "host=b": 0})
+
+    assert _picks(pool, 4) == ["host=a", "host=b", "host=a", "host=b"]
+
+
+def test_lagging_replica_is_skipped_until_it_catches_up(monkeypatch, clock):
+    lags = {"host=a": 0, "host=b": 120}
+    pool = _pool(monkeypatch, lags, max_lag=30)
+
+    assert _picks(pool, 3) == ["host=a", "host=a", "host=a"]
+    lags["host=b"] = 2
+    assert set(_picks(pool, 2)) == {"host=a", "host=b"}
+
+
+def test_down_replica_is_left_out_for_the_retry_period(monkeypatch, clock):
+    lags = {"host=a": 0, "host=b": None}
+    pool = _pool(monkeypatch, lags)
+
+    # host=b fails its lag check and is marked down
+    assert _picks(pool, 3) == ["host=a", "host=a", "host=a"]
+    lags["host=b"] = 0
+    clock.now += 10
+    assert _picks(pool, 2) == ["host=a", "host=a"]
+    clock.now += 30
+    assert set(_picks(pool, 2)) == {"host=a", "host=b"}
+
+
+def test_no_healthy_replica_means_the_primary(monkeypatch, clock):
+    pool = _pool(monkeypatch, {"host=a": 600})
+
+    assert pool.acquire() == (None, None)
+    assert ReplicaPool([]).acquire() == (None, None)
+
+
+class FakeReplica:
+    def __init__(self):
+        self.down = []
+
+    def mark_down(self, reason):
+        self.down.append(reason)
+
+
+class FakeReplicaPool:
+    def __init__(self, replica, conn):
+        self.replica, self.conn = replica, conn
+
+    def acquire(self):
+        return self.replica, self.conn
+
+
+def _client(replica, replica_conn):
+    client = PostgresClient.__new__(PostgresClient)
+    client.replicas = FakeReplicaPool(replica, replica_conn)
+    client.conn = FakeConnection("primary", {})
+    return client
+
+
+def test_read_falls_back_to_the_primary_when_the_replica_drops():
+    replica = FakeReplica()
+    client = _client(replica, "replica")
+
+    def read(conn, query, params):
+        if conn == "replica":
+            raise OperationalError("server closed the connection unexpectedly")
+        return conn.dsn
+
+    assert client._read(read, "SELECT 1", None) == "primary"
+    assert replica.down == ["OperationalError"]
+
+
+def test_query_error_on_a_replica_is_not_retried_on_the_primary():
+    replica = FakeReplica()
+    client = _client(replica, "replica")
+    reads = []
+
+    def read(conn, query, params):
+        reads.append(conn)
+        raise ProgrammingError("column does not exist")
+
+    with pytest.raises(RuntimeError, match="Database query failed"):
+        client._read(read, "SELECT nope", None)
+    assert reads == ["replica"]
+    assert replica.down == []
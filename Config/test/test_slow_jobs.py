@@ -0,0 +1,87 @@
+# tests/test_slow_jobs.py
+import json
+import threading
+
+import pytest
+
+from Config.SlowJobs import SlowJobRecorder, stage, record_query, note
+
+
+class FakeExplainDB:
+    """Answers EXPLAIN with a fixed plan and keeps the statements it got."""
+
+    def __init__(self):
+        self.explained = []
+
+    def fetch_one(self, query, params=None):
+        self.explained.append((query, params))
+        return {"QUERY PLAN": [{"Plan": {"Node Type": "Seq Scan"}}]}
+
+
+def _job(recorder, fail=False):
+    with recorder.job(b'{"location_id": 3}'):
+        with stage("query"):
+            record_query("SELECT * FROM stu_tracker.Sessions WHERE location_id = %s", [3], 0.5, 42, 4200)
+        note("csv_bytes", 100)
+        if fail:
+            raise ValueError("upload failed")
+
+
+def _records(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_slow_job_writes_one_record_with_its_queries_and_plans(tmp_path):
+    db = FakeExplainDB()
+    log = tmp_path / "slow.jsonl"
+    _job(SlowJobRecorder(db, threshold=0, path=str(log)))
+
+    [record] = _records(log)
+    assert record["payload"] == '{"location_id": 3}'
+    assert set(record["stages"]) == {"query"}
+    assert record["counters"] == {"csv_bytes": 100}
+    [query] = record["queries"]
+    assert query["params"] == [3]
+    assert (query["rows"], query["bytes"]) == (42, 4200)
+    assert query["plan"] == [{"Plan": {"Node Type": "Seq Scan"}}]
+    # Plain EXPLAIN unless ANALYZE is asked for
+    assert db.explained == [("EXPLAIN (FORMAT JSON) " + query["sql"], [3])]
+
+
+def test_explain_analyze_is_opt_in(tmp_path):
+    db = FakeExplainDB()
+    _job(SlowJobRecorder(db, threshold=0, path=str(tmp_path / "slow.jsonl"), analyze=True))
+
+    assert db.explained[0][0].startswith("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ")
+
+
+def test_fast_jobs_are_discarded(tmp_path):
+    db = FakeExplainDB()
+    log = tmp_path / "slow.jsonl"
+    _job(SlowJobRecorder(db, threshold=3600, path=str(log)))
+
+    assert not log.exists()
+    assert db.explained == []
+
+
+def test_failed_job_records_its_error(tmp_path):
+    log = tmp_path / "slow.jsonl"
+    with pytest.raises(ValueError):
+        _job(SlowJobRecorder(FakeExplainDB(), threshold=0, path=str(log)), fail=True)
+
+    [record] = _records(log)
+    assert record["error"] == "ValueError('upload failed')"
+
+
+def test_recorders_of_different_threads_append_whole_lines(tmp_path):
+    log = tmp_path / "slow.jsonl"
+    threads = [
+        threading.Thread(target=_job, args=(SlowJobRecorder(FakeExplainDB(), threshold=0, path=str(log)),))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(_records(log)) == 8
@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import resource
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Config.RabbitMQ reads these at import time; the harness never opens a broker connection.
+os.environ.setdefault("RABBITMQ_PORT", "5672")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import S3.main as s3_module
+from Config.PostgresClient import PostgresClient
+from LoadTest.seed import create_schema, seed, is_local_host
+from main import create_callback
+
+
+"""
+    Drives main.py's callback against local stand-ins and reports throughput,
+    latency percentiles and peak RSS.
+
+    python -m LoadTest.harness --seed --jobs 200 --mix "tutor/Sessions/all=1,student/Sessions/group_students=2"
+"""
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIX = {
+    ("tutor", "Sessions", "all"): 1,
+    ("tutor", "Sessions", "group_tutors"): 1,
+    ("student", "Sessions", "all"): 1,
+    ("student", "Sessions", "group_students"): 1,
+    ("student", "Assessments", "all"): 1,
+    ("student", "Assessments", "group_students"): 1,
+}
+SENTINEL_DATE = "0001-01-01T00:00:00Z"
+PERCENTILES = (50, 90, 95, 99)
+
+
+class FakeMethod:
+    def __init__(self, delivery_tag):
+        self.delivery_tag = delivery_tag
+
+
+class FakeChannel:
+    """In-process stand-in for a pika channel that records acks and nacks."""
+
+    def __init__(self):
+        self.acked = 0
+        self.nacked = 0
+
+    def basic_ack(self, delivery_tag=None, multiple=False):
+        self.acked += 1
+
+    def basic_nack(self, delivery_tag=None, multiple=False, requeue=True):
+        self.nacked += 1
+
+
+class FakeS3:
+    """In-memory stand-in for the boto3 S3 client used by S3Instance."""
+
+    def __init__(self):
+        self.objects = {}
+        self.bytes_uploaded = 0
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        if hasattr(Body, "read"):
+            Body = Body.read()
+        size = len(Body.encode("utf-8") if isinstance(Body, str) else Body)
+        self.objects[(Bucket, Key)] = size
+        self.bytes_uploaded += size
+        return {}
+
+
+def parse_mix(spec: str) -> dict:
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for entry in spec.split(","):
+        combo, _, weight = entry.strip().partition("=")
+        entity, data_type, sort_key = combo.split("/")
+        mix[(entity, data_type, sort_key)] = float(weight or 1)
+    return mix
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def build_jobs(mix: dict, count: int, locations: int, semesters: int, date, date_end, rng):
+    combos = list(mix.keys())
+    weights = [mix[c] for c in combos]
+    jobs = []
+    for n in range(count):
+        entity, data_type, sort_key = rng.choices(combos, weights=weights)[0]
+        jobs.append({
+            "entity": entity,
+            "data_type": data_type,
+            "sort_key": sort_key,
+            "location_id": rng.randint(1, locations),
+            "semester_id": rng.randint(1, semesters),
+            "date": date or SENTINEL_DATE,
+            "date_end": date_end or SENTINEL_DATE,
+            "s3_output_key": f"loadtest/{n}-{entity}-{data_type}-{sort_key}.csv",
+        })
+    return jobs
+
+
+def run(db, jobs, warmup=0):
+    fake_s3 = FakeS3()
+    s3_module.s3 = fake_s3
+    channel = FakeChannel()
+    callback = create_callback(db)
+
+    for job in jobs[:warmup]:
+        callback(channel, FakeMethod(0), None, json.dumps(job).encode("utf-8"))
+    jobs = jobs[warmup:]
+
+    channel = FakeChannel()
+    fake_s3.bytes_uploaded = 0
+    latencies = defaultdict(list)
+    failures = 0
+    started = time.perf_counter()
+    for tag, job in enumerate(jobs, start=1):
+        body = json.dumps(job).encode("utf-8")
+        t0 = time.perf_counter()
+        try:
+            callback(channel, FakeMethod(tag), None, body)
+        except Exception:
+            failures += 1
+            logger.exception(f"Job {job['s3_output_key']} raised")
+        latencies[(job["entity"], job["data_type"], job["sort_key"])].append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "jobs": len(jobs),
+        "elapsed": elapsed,
+        "latencies": latencies,
+        "acked": channel.acked,
+        "nacked": channel.nacked,
+        "failures": failures,
+        "bytes_uploaded": fake_s3.bytes_uploaded,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def format_report(result) -> str:
+    all_latencies = [v for values in result["latencies"].values() for v in values]
+    lines = [
+        f"jobs: {result['jobs']}  elapsed: {result['elapsed']:.2f}s  "
+        f"throughput: {result['jobs'] / result['elapsed'] if result['elapsed'] else 0:.2f} jobs/s",
+        f"acked: {result['acked']}  nacked: {result['nacked']}  failures: {result['failures']}  "
+        f"uploaded: {result['bytes_uploaded'] / (1024 * 1024):.2f} MiB  peak RSS: {result['peak_rss_mb']:.1f} MiB",
+        "",
+        f"{'job':<40}{'n':>6}" + "".join(f"{'p' + str(p):>10}" for p in PERCENTILES) + f"{'max':>10}",
+    ]
+    rows = sorted(result["latencies"].items()) + [(("all", "", ""), all_latencies)]
+    for combo, values in rows:
+        name = "/".join(part for part in combo if part)
+        lines.append(
+            f"{name:<40}{len(values):>6}"
+            + "".join(f"{percentile(values, p) * 1000:>8.1f}ms" for p in PERCENTILES)
+            + f"{(max(values) if values else 0) * 1000:>8.1f}ms"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the report consumer against local stand-ins.")
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--mix", default="", help='e.g. "tutor/Sessions/all=1,student/Assessments/group_students=3"')
+    parser.add_argument("--date", default=None, help="payload date, defaults to the open-ended sentinel")
+    parser.add_argument("--date-end", default=None)
+    parser.add_argument("--random-seed", type=int, default=7)
+    parser.add_argument("--seed", action="store_true", help="create and fill the stu_tracker tables first")
+    parser.add_argument("--locations", type=int, default=2)
+    parser.add_argument("--semesters", type=int, default=2)
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--sessions-per-day", type=int, default=30)
+    parser.add_argument("--students", type=int, default=400)
+    parser.add_argument("--allow-remote", action="store_true", help="allow seeding a non-local database")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    db = PostgresClient()
+    try:
+        if args.seed:
+            if not args.allow_remote and not is_local_host(os.getenv("POSTGRES_URL")):
+                raise SystemExit("Refusing to seed a non-local database without --allow-remote")
+            create_schema(db)
+            seed(db, locations=args.locations, semesters=args.semesters, days=args.days,
+                 sessions_per_day=args.sessions_per_day, students=args.students)
+
+        rng = random.Random(args.random_seed)
+        jobs = build_jobs(parse_mix(args.mix), args.jobs + args.warmup, args.locations,
+                          args.semesters, args.date, args.date_end, rng)
+        result = run(db, jobs, warmup=args.warmup)
+
+        if args.json:
+            summary = dict(result)
+            summary["latencies"] = {
+                "/".join(combo): {f"p{p}": percentile(v, p) for p in PERCENTILES}
+                for combo, v in result["latencies"].items()
+            }
+            print(json.dumps(summary, indent=2))
+        else:
+            print(format_report(result))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import logging
+from urllib.parse import urlparse
+
+
+"""
+    Creates the stu_tracker tables the report queries read from and fills them
+    with synthetic rows. Intended for a throwaway local Postgres only.
+"""
+
+logger = logging.getLogger(__name__)
+
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1", "postgres", "db")
+
+SCHEMA = [
+    "CREATE SCHEMA IF NOT EXISTS stu_tracker",
+    "CREATE TABLE IF NOT EXISTS stu_tracker.Tutors ("
+    "id SERIAL PRIMARY KEY, first_name TEXT, last_name TEXT)",
+    "CREATE TABLE IF NOT EXISTS stu_tracker.Programs ("
+    "id SERIAL PRIMARY KEY, program_name TEXT)",
+    "CREATE TABLE IF NOT EXISTS stu_tracker.Subjects ("
+    "id SERIAL PRIMARY KEY, title TEXT)",
+    "CREATE TABLE IF NOT EXISTS stu_tracker.Students ("
+    "id SERIAL PRIMARY KEY, first_name TEXT, last_name TEXT, grade_level INT, "
+    "timeframe TEXT, timeframe_start DATE, timeframe_end DATE)",
+    "CREATE TABLE IF NOT EXISTS stu_tracker.Sessions ("
+    "id SERIAL PRIMARY KEY, tutor_id INT, program_id INT, subject_id INT, "
+    "location_id INT, semester_id INT, session_date TIMESTAMP, substitute BOOLEAN, "
+    "student_count INT, start_time TIME, duration INT, notes TEXT)",
+    "CREATE TABLE IF NOT EXISTS stu_tracker.Session_students ("
+    "id SERIAL PRIMARY KEY, session_id INT, student_id INT, subject_id INT, "
+    "absent BOOLEAN, duration INT)",
+    "CREATE TABLE IF NOT EXISTS stu_tracker.Assessments ("
+    "id SERIAL PRIMARY KEY, title TEXT, max_score NUMERIC, letter TEXT, cycle INT, "
+    "pre BOOLEAN, mid BOOLEAN, post BOOLEAN, version INT)",
+    "CREATE TABLE IF NOT EXISTS stu_tracker.Assessments_students ("
+    "id SERIAL PRIMARY KEY, assessment_id INT, student_id INT, session_id INT, "
+    "subject_id INT, score NUMERIC)",
+    "CREATE TABLE IF NOT EXISTS stu_tracker.Organization_report ("
+    "id SERIAL PRIMARY KEY, s3_output_key TEXT, status TEXT, retry_count INT, preview_status TEXT)",
+    "CREATE INDEX IF NOT EXISTS sessions_location_idx ON stu_tracker.Sessions (location_id, semester_id)",
+    "CREATE INDEX IF NOT EXISTS session_students_session_idx ON stu_tracker.Session_students (session_id)",
+    "CREATE INDEX IF NOT EXISTS assessments_students_session_idx ON stu_tracker.Assessments_students (session_id)",
+]
+
+TABLES = [
+    "Assessments_students", "Assessments", "Session_students", "Sessions",
+    "Students", "Subjects", "Programs", "Tutors", "Organization_report",
+]
+
+
+def is_local_host(host) -> bool:
+    if not host:
+        return False
+    if "://" in host:
+        host = urlparse(host).hostname
+    return host in LOCAL_HOSTS
+
+
+def create_schema(db):
+    for statement in SCHEMA:
+        db.execute(statement)
+
+
+def truncate(db):
+    tables = ", ".join(f"stu_tracker.{table}" for table in TABLES)
+    db.execute(f"TRUNCATE {tables} RESTART IDENTITY")
+
+
+def seed(db, locations=2, semesters=2, tutors=40, students=400, programs=5,
+         subjects=8, assessments=20, days=120, sessions_per_day=30,
+         students_per_session=4, start_date="2025-01-06"):
+    """
+        Generates the synthetic dataset server side with generate_series so that
+        seeding a few million rows does not round-trip through python.
+    """
+    logger.info("Seeding synthetic stu_tracker data.")
+    truncate(db)
+    db.execute(
+        "INSERT INTO stu_tracker.Tutors (first_name, last_name) "
+        "SELECT 'Tutor' || g, 'Last' || g FROM generate_series(1, %s) g",
+        (tutors,),
+    )
+    db.execute(
+        "INSERT INTO stu_tracker.Programs (program_name) "
+        "SELECT 'Program ' || g FROM generate_series(1, %s) g",
+        (programs,),
+    )
+    db.execute(
+        "INSERT INTO stu_tracker.Subjects (title) "
+        "SELECT 'Subject ' || g FROM generate_series(1, %s) g",
+        (subjects,),
+    )
+    db.execute(
+        "INSERT INTO stu_tracker.Students "
+        "(first_name, last_name, grade_level, timeframe, timeframe_start, timeframe_end) "
+        "SELECT 'Student' || g, 'Family' || g, 1 + g %% 12, 'semester', "
+        "%s::date, %s::date + %s FROM generate_series(1, %s) g",
+        (start_date, start_date, days, students),
+    )
+    db.execute(
+        "INSERT INTO stu_tracker.Assessments "
+        "(title, max_score, letter, cycle, pre, mid, post, version) "
+        "SELECT 'Assessment ' || g, 10 * (1 + g %% 5), chr(65 + g %% 6), 1 + g %% 3, "
+        "g %% 3 = 0, g %% 3 = 1, g %% 3 = 2, 1 FROM generate_series(1, %s) g",
+        (assessments,),
+    )
+    # Sessions are spread over every location/semester so each job filter hits data.
+    db.execute(
+        "INSERT INTO stu_tracker.Sessions "
+        "(tutor_id, program_id, subject_id, location_id, semester_id, session_date, "
+        "substitute, student_count, start_time, duration, notes) "
+        "SELECT 1 + (random() * (%s - 1))::int, 1 + (random() * (%s - 1))::int, "
+        "CASE WHEN random() < 0.1 THEN NULL ELSE 1 + (random() * (%s - 1))::int END, "
+        "1 + g %% %s, 1 + (g / %s) %% %s, "
+        "%s::timestamp + ((g / (%s * %s)) %% %s) * interval '1 day' + interval '15 hours', "
+        "random() < 0.05, %s, '15:00', 30 + (random() * 60)::int, 'note ' || g "
+        "FROM generate_series(0, %s - 1) g",
+        (tutors, programs, subjects, locations, locations, semesters, start_date,
+         locations, semesters, days, students_per_session, days * sessions_per_day * locations),
+    )
+    db.execute(
+        "INSERT INTO stu_tracker.Session_students (session_id, student_id, subject_id, absent, duration) "
+        "SELECT s.id, 1 + (random() * (%s - 1))::int, s.subject_id, random() < 0.15, s.duration "
+        "FROM stu_tracker.Sessions s, generate_series(1, %s)",
+        (students, students_per_session),
+    )
+    db.execute(
+        "INSERT INTO stu_tracker.Assessments_students (assessment_id, student_id, session_id, subject_id, score) "
+        "SELECT 1 + (random() * (%s - 1))::int, ss.student_id, ss.session_id, ss.subject_id, "
+        "round((random() * 10)::numeric, 1) "
+        "FROM stu_tracker.Session_students ss WHERE random() < 0.2",
+        (assessments,),
+    )
+    db.execute("ANALYZE")
+    logger.info("Finished seeding synthetic stu_tracker data.")
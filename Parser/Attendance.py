@@ -0,0 +1,93 @@
+import pandas as pd
+
+
+"""
+    Shapes the per entity attendance columns of the grouped reports.
+    layout(_): str selected by the payload, defaults to DAILY
+
+    Rows are first reduced to one entry per entity and session day (reduce_days),
+    partial reductions of several chunks can be merged (combine_days) and the
+    result is then laid out (attendance).
+"""
+
+DAILY = 'daily'
+SESSION_DAYS = 'session_days'
+WEEKLY = 'weekly'
+MONTHLY = 'monthly'
+LONG = 'long'
+LAYOUTS = (DAILY, SESSION_DAYS, WEEKLY, MONTHLY, LONG)
+
+BUCKETS = {WEEKLY: 'W', MONTHLY: 'M'}
+SEPARATOR = " ,"
+PRESENT_COUNT = "_present_count"
+
+
+def reduce_days(file, rows, date_column, status_column, present="P"):
+    """Joins the statuses of each entity and day and counts the present ones."""
+    keys = rows + [date_column]
+    file = file[keys + [status_column]].assign(**{PRESENT_COUNT: file[status_column] == present})
+    return (
+        file.groupby(keys)
+        .agg(**{status_column: (status_column, SEPARATOR.join), PRESENT_COUNT: (PRESENT_COUNT, "sum")})
+        .reset_index()
+    )
+
+
+def combine_days(reduced_frames, rows, date_column, status_column):
+    """Merges reductions of consecutive chunks, keeping the chunk order of the statuses."""
+    reduced_frames = list(reduced_frames)
+    if len(reduced_frames) == 1:
+        return reduced_frames[0]
+    return (
+        pd.concat(reduced_frames, ignore_index=True)
+        .groupby(rows + [date_column])
+        .agg(**{status_column: (status_column, SEPARATOR.join), PRESENT_COUNT: (PRESENT_COUNT, "sum")})
+        .reset_index()
+    )
+
+
+def attendance(reduced, rows, date_column, status_column, layout, fill):
+    """
+        Returns a frame indexed by rows holding the attendance for each entity.
+        Only DAILY reindexes to every calendar day, the other layouts are built
+        from the days and buckets that actually have sessions.
+    """
+    if layout is None:
+        layout = DAILY
+    if layout == DAILY:
+        all_dates = pd.date_range(reduced[date_column].min(), reduced[date_column].max(), freq="D")
+        return (
+            reduced.pivot_table(
+                index=rows,
+                columns=date_column,
+                values=status_column,
+                aggfunc=lambda x: SEPARATOR.join(x),
+            )
+            .reindex(columns=all_dates)
+            .fillna(fill)
+        )
+    if layout == SESSION_DAYS:
+        return (
+            reduced.set_index(rows + [date_column])[status_column]
+            .unstack(date_column)
+            .fillna(fill)
+        )
+    if layout in BUCKETS:
+        freq = BUCKETS[layout]
+        periods = reduced[date_column].dt.to_period(freq)
+        counts = (
+            reduced[PRESENT_COUNT]
+            .groupby([reduced[key] for key in rows] + [periods.rename(date_column)])
+            .sum()
+            .unstack(date_column, fill_value=0)
+        )
+        buckets = pd.period_range(periods.min(), periods.max(), freq=freq)
+        counts = counts.reindex(columns=buckets, fill_value=0).astype(int)
+        counts.columns = buckets.start_time
+        return counts
+    if layout == LONG:
+        return (
+            reduced.sort_values(rows + [date_column])
+            .set_index(rows)[[date_column, status_column]]
+        )
+    raise ValueError(f"Unknown attendance layout: {layout}")
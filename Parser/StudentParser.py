@@ -1,10 +1,13 @@
 import pandas as pd
 import json
+from Config.Spill import SpilledRows, ChunkedFrame, iter_frames
+from Config.Dimensions import PROGRAMS, SUBJECTS
+from Parser.Attendance import attendance, reduce_days, combine_days, DAILY, LAYOUTS
 
 
 """
     This class will help parse the data incoming from get_tutor_file_data()
-    init(_): List[dict]
+    init(_): List[dict] or SpilledRows
 """
 
 SESSIONS = 'Sessions'
@@ -14,13 +17,16 @@ ALL = 'all'
 
 
 class StudentParser:
-    def __init__(self, data, assessments, sort_key, data_type):
+    def __init__(self, data, assessments, sort_key, data_type, layout=DAILY, dimensions=None):
         self.data = data
         self.data_type = data_type
         self.assessments = assessments
         self.sort_key = sort_key
+        self.layout = layout or DAILY
+        # DimensionCache for rows fetched with ids only
+        self.dimensions = dimensions
         self.file = None
-        if self.data and self.data_type == SESSIONS:
+        if self.data and self.data_type == SESSIONS and self.layout in LAYOUTS:
             self.file = self.parse()
         elif self.data and self.data_type == ASSESSMENTS:
             self.file = self.parse_assessments()
@@ -37,48 +43,78 @@ class StudentParser:
         if self.isDataEmpty():
             return None
         return self.file
+    def frames(self):
+        """Yields the session rows one chunk at a time with normalized dates and P/A marks."""
+        for file in iter_frames(self.data):
+            if self.dimensions is not None:
+                file = self.dimensions.attach(file, SUBJECTS, "subject_id", {"title": "subject"})
+                # Sessions without a subject are reported as NA
+                file["subject"] = file["subject"].where(file["subject_id"].notna(), "NA")
+                file = self.dimensions.attach(file, PROGRAMS, "program_id")
+                # The names take the place of the ids, as when the query joined them
+                file = file.drop(columns=["subject_id", "program_id"])
+            file["session_date"] = pd.to_datetime(file["session_date"]).dt.normalize()
+            file["present"] = file["absent"].apply(lambda x: "P" if not x else "A")
+            yield file
+
+    def assessment_frames(self):
+        """
+            Yields the assessment rows one chunk at a time with normalized dates
+            and scores, ordered by student id for GROUP_STUDENTS when spilled.
+        """
+        cols = ['id','first_name', 'last_name','session_date', 'session_id' ,'assessment_title','subject_title' , 'letter', 'cycle', 'pre', 'mid', 'post', 'version', 'score', 'max_score']
+        if isinstance(self.assessments, SpilledRows) and self.sort_key == GROUP_STUDENTS:
+            chunks = self.assessments.iter_sorted_frames("id")
+        else:
+            chunks = iter_frames(self.assessments)
+        for frame in chunks:
+            if self.dimensions is not None:
+                frame = self.dimensions.attach(frame, SUBJECTS, "subject_id", {"title": "subject_title"})
+            frame = frame[cols].copy()
+            frame['session_date'] = pd.to_datetime(frame['session_date']).dt.normalize()
+            frame['normalized_score'] = frame[['max_score', 'score']].apply(lambda row: (row['score']/row['max_score']) * 100 , axis=1).round(2)
+            yield frame
+
     ## subject_title
     def parse_assessments(self)->pd.DataFrame:
         if self.isAssessmentDataEmpty():
             return None
-        file = pd.DataFrame(self.assessments)
-        cols = ['id','first_name', 'last_name','session_date', 'session_id' ,'assessment_title','subject_title' , 'letter', 'cycle', 'pre', 'mid', 'post', 'version', 'score', 'max_score']
-        file = file[cols]
-
-        file['session_date'] = pd.to_datetime(file['session_date']).dt.normalize()
-        file['normalized_score'] = file[['max_score', 'score']].apply(lambda row: (row['score']/row['max_score']) * 100 , axis=1).round(2)
+        if self.sort_key not in (GROUP_STUDENTS, ALL):
+            return None
+        if isinstance(self.assessments, SpilledRows):
+            # Streamed to the CSV one chunk at a time instead of concatenated
+            return ChunkedFrame(self.assessment_frames)
+        file = pd.concat(list(self.assessment_frames()), ignore_index=True)
         if self.sort_key == GROUP_STUDENTS:
             grouped = file.sort_values(by='id')
             return grouped
-        elif self.sort_key == ALL:
-            return file
-        return None
+        return file
     
     def parse(self) ->pd.DataFrame:
         if self.isDataEmpty():
             return None
-        file = pd.DataFrame(self.data)
-        file["session_date"] = pd.to_datetime(file["session_date"]).dt.normalize()
-        file["present"] = file["absent"].apply(lambda x: "P" if not x else "A")
 
         if self.sort_key == GROUP_STUDENTS:
             pivote_rows = ['id', 'first_name', 'last_name', 'subject', 'program_name']
-            date_range = pd.date_range(file['session_date'].min(), file["session_date"].max(), freq="D")
+            partials = []
+            days = []
+            # Aggregate every chunk on its own, then merge the partial results
+            for file in self.frames():
+                partials.append(file.groupby(pivote_rows).agg(
+                    duration_total=("duration", "sum"),
+                    absent_count=("absent", "sum"),
+                    present_count=("present", "count")
+                ))
+                days.append(reduce_days(file, pivote_rows, "session_date", "present"))
+
+            file_df = partials[0]
+            if len(partials) > 1:
+                file_df = pd.concat(partials).groupby(level=pivote_rows).sum()
+            file_df = file_df.reset_index()
 
-            file_df = file.groupby(['id', 'first_name', 'last_name', 'subject', 'program_name']).agg(
-                duration_total=("duration", "sum"),
-                absent_count=("absent", "sum"),
-                present_count=("present", "count")
-            ).reset_index()
-            
-            pivot = (
-                file.pivot_table(
-                    index=pivote_rows,
-                    columns="session_date",
-                    values="present",
-                    aggfunc=lambda x: " ,".join(x)
-                )
-            ).reindex(columns=date_range).fillna("A")
+            # Daily grid, session days only, weekly/monthly counts or long rows
+            reduced = combine_days(days, pivote_rows, "session_date", "present")
+            pivot = attendance(reduced, pivote_rows, "session_date", "present", self.layout, fill="A")
 
             file_pivot_combined = pd.merge(
                 file_df,
@@ -88,7 +124,10 @@ class StudentParser:
             )    
             return file_pivot_combined
         elif self.sort_key == ALL:
-            return file
+            if isinstance(self.data, SpilledRows):
+                # Streamed to the CSV one chunk at a time instead of concatenated
+                return ChunkedFrame(self.frames)
+            return pd.concat(list(self.frames()), ignore_index=True)
         else:
             return None
 
@@ -1,24 +1,42 @@
 import pandas as pd
 import json
 from datetime import datetime, timedelta
+from Config.Spill import SpilledRows, ChunkedFrame, iter_frames
+from Config.Dimensions import TUTORS, PROGRAMS
+from Parser.Attendance import attendance, reduce_days, combine_days, DAILY, LAYOUTS
 
 
 """
     This class will help parse the data incoming from get_tutor_file_data()
-    init(_): List[dict]
+    init(_): List[dict] or SpilledRows
 """
 
 SESSIONS = 'Sessions'
 ASSESSMENTS = 'Assessments'
 GROUP_TUTORS = 'group_tutors'
 ALL = 'all'
+COLUMNS = ["tutor_id", "first_name", "last_name", "session_id", "student_count","session_date", "duration", "notes", "program_name" ,"start_time", "substitute"]
+HEADERS = {"first_name": "First name",
+           "last_name": "Last name",
+           "session_id": "Session id",
+           "tutor_id": "Tutor id",
+           "student_count": "Student count",
+           "session_date": "Session date",
+           "duration": "Duration",
+           "notes": "Notes",
+           "program_name": "Program name",
+           "substitute": "Substitute",
+           "start_time": "Start time"}
 
 class TutorParser:
-    def __init__(self, data, sort_key):
+    def __init__(self, data, sort_key, layout=DAILY, dimensions=None):
         self.data = data
         self.sort_key = sort_key
+        self.layout = layout or DAILY
+        # DimensionCache for rows fetched with ids only
+        self.dimensions = dimensions
         self.file = None
-        if self.data:
+        if self.data and self.layout in LAYOUTS:
             self.file = self.parse()
         
     def isDataEmpty(self)->bool:
@@ -29,49 +47,50 @@ class TutorParser:
             return None
         return self.file
 
+    def frames(self):
+        """Yields the fetched rows one chunk at a time, renamed to the report headers."""
+        for file in iter_frames(self.data, COLUMNS + ["program_id"]):
+            if self.dimensions is not None:
+                file = self.dimensions.attach(file, TUTORS, "tutor_id")
+                file = self.dimensions.attach(file, PROGRAMS, "program_id")
+            file = file.reindex(columns=COLUMNS)
+            file = file.rename(columns=HEADERS)
+            yield file
+
     def parse(self) ->pd.DataFrame:
         if self.isDataEmpty():
             return None
-        file = pd.DataFrame(self.data)
-        columns = ["tutor_id", "first_name", "last_name", "session_id", "student_count","session_date", "duration", "notes", "program_name" ,"start_time", "substitute"]
-        file = file.reindex(columns=columns)
-        file = file.rename(columns={"first_name": "First name",
-                                    "last_name": "Last name",
-                                    "session_id": "Session id",
-                                    "tutor_id": "Tutor id",
-                                    "student_count": "Student count",
-                                    "session_date": "Session date",
-                                    "duration": "Duration",
-                                    "notes": "Notes",
-                                    "program_name": "Program name",
-                                    "substitute": "Substitute",
-                                    "start_time": "Start time"})
-    
         if self.sort_key == GROUP_TUTORS:
-            # Normalize session date column
-            file["Session date"] = pd.to_datetime(file["Session date"]).dt.normalize()
-            #Mark present days
-            file["present"] = "P"
             rows = ['First name', 'Last name','Tutor id']
-            # Get the min max dates range using pandas
-            all_dates = pd.date_range(file["Session date"].min(), file["Session date"].max(), freq="D")
-            df = file.groupby(['First name', 'Last name', 'Tutor id', 'Program name']).agg(
-                                                                  total_students=("Student count", "sum"), 
-                                                                  substitute_flag=("Substitute", lambda x: "Yes" if x.any() else "No"),
-                                                                  sessions=("Session id", "count"),
-                                                                ).reset_index()    
-            
-            pivot_table = (
-                file.pivot_table(
-                    index=rows,
-                    columns='Session date',
-                    values='present',
-                    aggfunc=lambda x : " ,".join(x),
+            groups = ['First name', 'Last name', 'Tutor id', 'Program name']
+            partials = []
+            days = []
+            # Aggregate every chunk on its own, then merge the partial results
+            for file in self.frames():
+                # Normalize session date column
+                file["Session date"] = pd.to_datetime(file["Session date"]).dt.normalize()
+                #Mark present days
+                file["present"] = "P"
+                partials.append(file.groupby(groups).agg(
+                                                        total_students=("Student count", "sum"),
+                                                        substitute_flag=("Substitute", "any"),
+                                                        sessions=("Session id", "count"),
+                                                      ))
+                days.append(reduce_days(file, rows, 'Session date', 'present'))
+
+            df = partials[0]
+            if len(partials) > 1:
+                df = pd.concat(partials).groupby(level=groups).agg(
+                    total_students=("total_students", "sum"),
+                    substitute_flag=("substitute_flag", "any"),
+                    sessions=("sessions", "sum"),
                 )
-                .reindex(columns=all_dates)
-                .fillna("N")
-            )
-            file = pivot_table.reset_index()
+            df["substitute_flag"] = df["substitute_flag"].map(lambda x: "Yes" if x else "No")
+            df = df.reset_index()
+
+            # Daily grid, session days only, weekly/monthly counts or long rows
+            reduced = combine_days(days, rows, 'Session date', 'present')
+            pivot_table = attendance(reduced, rows, 'Session date', 'present', self.layout, fill="N")
             final = pd.merge(
                 df,
                 pivot_table,
@@ -81,7 +100,10 @@ class TutorParser:
         
             return final
         elif self.sort_key == ALL:
-            return file
+            if isinstance(self.data, SpilledRows):
+                # Streamed to the CSV one chunk at a time instead of concatenated
+                return ChunkedFrame(self.frames)
+            return pd.concat(list(self.frames()), ignore_index=True)
         else:
             return None
 
@@ -10,6 +10,11 @@ from Parser.StudentParser import (
     SESSIONS,
     ASSESSMENTS,
 )
+from Parser.Attendance import SESSION_DAYS, WEEKLY, MONTHLY, LONG
+from Config.Spill import SpilledRows
+from S3.Csv import to_csv_bytes
+from Config.Dimensions import DimensionCache
+from Config.test.test_dimensions import FakeDimensionDB
 
 def sessions_rows():
     # Two students, two days; absent toggles to test present mapping
@@ -141,4 +146,109 @@ def test_empty_assessments_returns_none():
         sort_key=ALL,
         data_type=ASSESSMENTS,
     )
-    assert parser.get_file() is None
\ No newline at end of file
+    assert parser.get_file() is None
+
+def layout_rows():
+    # Ada attends twice three weeks apart, Alan is absent once
+    d0 = datetime(2025, 9, 1, 10, 15)
+    return [
+        dict(id=1, first_name="Ada", last_name="Lovelace", subject="Math", program_name="Boost",
+             session_date=d0, duration=60, absent=False),
+        dict(id=1, first_name="Ada", last_name="Lovelace", subject="Math", program_name="Boost",
+             session_date=d0 + timedelta(days=20), duration=45, absent=False),
+        dict(id=2, first_name="Alan", last_name="Turing", subject="CS", program_name="Boost",
+             session_date=d0, duration=30, absent=True),
+    ]
+
+
+def test_sessions_session_days_layout_only_has_days_with_sessions():
+    parser = StudentParser(layout_rows(), None, GROUP_STUDENTS, SESSIONS, layout=SESSION_DAYS)
+    out = parser.get_file()
+    date_cols = [c for c in out.columns if isinstance(c, pd.Timestamp)]
+    assert date_cols == [pd.Timestamp("2025-09-01"), pd.Timestamp("2025-09-21")]
+    alan = out[out["id"] == 2].iloc[0]
+    assert alan[date_cols[0]] == "A"
+    assert alan[date_cols[1]] == "A"
+
+
+def test_sessions_weekly_layout_counts_present_per_bucket():
+    parser = StudentParser(layout_rows(), None, GROUP_STUDENTS, SESSIONS, layout=WEEKLY)
+    out = parser.get_file()
+    date_cols = [c for c in out.columns if isinstance(c, pd.Timestamp)]
+    # Buckets start on the monday of each week, empty weeks in between are kept
+    assert date_cols == list(pd.date_range("2025-09-01", periods=3, freq="7D"))
+    ada = out[out["id"] == 1].iloc[0]
+    assert [ada[c] for c in date_cols] == [1, 0, 1]
+    alan = out[out["id"] == 2].iloc[0]
+    assert [alan[c] for c in date_cols] == [0, 0, 0]
+
+
+def test_sessions_monthly_layout_counts_present_per_bucket():
+    parser = StudentParser(layout_rows(), None, GROUP_STUDENTS, SESSIONS, layout=MONTHLY)
+    out = parser.get_file()
+    date_cols = [c for c in out.columns if isinstance(c, pd.Timestamp)]
+    assert date_cols == [pd.Timestamp("2025-09-01")]
+    assert out[out["id"] == 1].iloc[0][date_cols[0]] == 2
+
+
+def test_sessions_long_layout_has_one_row_per_session_day():
+    parser = StudentParser(layout_rows(), None, GROUP_STUDENTS, SESSIONS, layout=LONG)
+    out = parser.get_file()
+    assert len(out) == 3
+    assert list(out[out["id"] == 1]["present"]) == ["P", "P"]
+    assert list(out[out["id"] == 2]["present"]) == ["A"]
+
+
+def test_unknown_layout_returns_none():
+    parser = StudentParser(layout_rows(), None, GROUP_STUDENTS, SESSIONS, layout="yearly")
+    assert parser.get_file() is None
+
+
+def test_sessions_spilled_rows_match_in_memory_rows():
+    rows = layout_rows()
+    spilled = SpilledRows()
+    # One row per Arrow file so every chunk is aggregated on its own
+    for row in rows:
+        spilled.append([row])
+    try:
+        for sort_key in (ALL, GROUP_STUDENTS):
+            expected = StudentParser(rows, None, sort_key, SESSIONS).get_file()
+            actual = StudentParser(spilled, None, sort_key, SESSIONS).get_file()
+            assert to_csv_bytes(actual) == expected.to_csv(index=False).encode("utf-8")
+    finally:
+        spilled.close()
+
+
+def test_assessments_spilled_rows_match_in_memory_rows():
+    d0 = datetime(2025, 9, 1, 9, 0)
+    assessments = [
+        dict(id=student, first_name="Ada", last_name="Lovelace", session_date=d0 + timedelta(days=day),
+             session_id=day, assessment_title="Quiz", subject_title="Math", letter="A", cycle=1,
+             pre=True, mid=False, post=False, version=1, score=day + 1, max_score=9)
+        for day, student in enumerate([3, 1, 2, 1, 3, 2, 1])
+    ]
+    spilled = SpilledRows()
+    # Two rows per Arrow file, the sort by id has to reach across files
+    for start in range(0, len(assessments), 2):
+        spilled.append(assessments[start:start + 2])
+    try:
+        for sort_key in (ALL, GROUP_STUDENTS):
+            expected = StudentParser(layout_rows(), assessments, sort_key, ASSESSMENTS).get_file()
+            actual = StudentParser(layout_rows(), spilled, sort_key, ASSESSMENTS).get_file()
+            assert to_csv_bytes(actual) == expected.to_csv(index=False).encode("utf-8")
+    finally:
+        spilled.close()
+
+
+def test_ids_only_sessions_get_subject_and_program_from_dimension_cache():
+    named, ids_only = [], []
+    for row in layout_rows():
+        subject = row.pop("subject")
+        row.pop("program_name")
+        # Names came last from the joined query, Alan's session has no subject (NA)
+        named.append(dict(row, subject=subject if subject == "Math" else "NA", program_name="Math Boost"))
+        ids_only.append(dict(row, subject_id=3 if subject == "Math" else None, program_id=7))
+    for sort_key in (ALL, GROUP_STUDENTS):
+        expected = StudentParser(named, None, sort_key, SESSIONS).get_file()
+        actual = StudentParser(ids_only, None, sort_key, SESSIONS, dimensions=DimensionCache(FakeDimensionDB())).get_file()
+        assert actual.to_csv(index=False) == expected.to_csv(index=False)
@@ -4,6 +4,11 @@ import pytest
 from datetime import datetime, timedelta
 
 from Parser.TutorParser import TutorParser
+from Parser.Attendance import SESSION_DAYS, MONTHLY, LONG
+from Config.Spill import SpilledRows
+from S3.Csv import to_csv_bytes
+from Config.Dimensions import DimensionCache
+from Config.test.test_dimensions import FakeDimensionDB
 SESSIONS = 'Sessions'
 ASSESSMENTS = 'Assessments'
 GROUP_TUTORS = 'group_tutors'
@@ -103,4 +108,71 @@ def test_handles_missing_optional_fields():
     assert len(df) == 1
     assert "Notes" in df.columns
     assert "Start time" in df.columns
-    assert "Substitute" in df.columns
\ No newline at end of file
+    assert "Substitute" in df.columns
+def _layout_rows():
+    base = datetime(2025, 9, 1, 10, 30)
+    return [
+        {
+            "first_name": "Ada", "last_name": "Lovelace",
+            "session_id": 100, "tutor_id": 1, "student_count": 3,
+            "session_date": base, "duration": 60, "notes": "ok",
+            "program_name": "Math Boost", "start_time": "10:30", "substitute": False
+        },
+        {
+            "first_name": "Ada", "last_name": "Lovelace",
+            "session_id": 101, "tutor_id": 1, "student_count": 2,
+            "session_date": base + timedelta(days=40), "duration": 45, "notes": "",
+            "program_name": "Math Boost", "start_time": "10:30", "substitute": True
+        },
+    ]
+
+def test_group_tutors_session_days_layout_skips_empty_days():
+    df = TutorParser(_layout_rows(), sort_key=GROUP_TUTORS, layout=SESSION_DAYS).get_file()
+    date_cols = [c for c in df.columns if isinstance(c, pd.Timestamp)]
+    assert date_cols == [pd.Timestamp("2025-09-01"), pd.Timestamp("2025-10-11")]
+    assert set(df[date_cols].iloc[0].values) == {"P"}
+
+def test_group_tutors_monthly_layout_counts_sessions():
+    df = TutorParser(_layout_rows(), sort_key=GROUP_TUTORS, layout=MONTHLY).get_file()
+    date_cols = [c for c in df.columns if isinstance(c, pd.Timestamp)]
+    assert date_cols == [pd.Timestamp("2025-09-01"), pd.Timestamp("2025-10-01")]
+    assert list(df[date_cols].iloc[0].values) == [1, 1]
+    assert df.iloc[0]["sessions"] == 2
+
+def test_group_tutors_long_layout_has_one_row_per_session_day():
+    df = TutorParser(_layout_rows(), sort_key=GROUP_TUTORS, layout=LONG).get_file()
+    assert len(df) == 2
+    assert list(df["Session date"]) == [pd.Timestamp("2025-09-01"), pd.Timestamp("2025-10-11")]
+
+def test_spilled_rows_match_in_memory_rows():
+    rows = _layout_rows() + _sample_rows()
+    for row in rows:
+        row.setdefault("session_id", row.get("id"))
+    spilled = SpilledRows()
+    # One row per Arrow file so every chunk is aggregated on its own
+    for row in rows:
+        spilled.append([row])
+    try:
+        for sort_key in (ALL, GROUP_TUTORS):
+            expected = TutorParser(rows, sort_key=sort_key).get_file()
+            actual = TutorParser(spilled, sort_key=sort_key).get_file()
+            assert to_csv_bytes(actual) == expected.to_csv(index=False).encode("utf-8")
+    finally:
+        spilled.close()
+
+def test_ids_only_rows_get_names_from_dimension_cache():
+    named = _layout_rows()
+    ids_only = [
+        {k: v for k, v in row.items() if k not in ("first_name", "last_name", "program_name")}
+        for row in named
+    ]
+    for row in ids_only:
+        row["program_id"] = 7
+    db = FakeDimensionDB()
+    dimensions = DimensionCache(db)
+    for sort_key in (ALL, GROUP_TUTORS):
+        expected = TutorParser(named, sort_key=sort_key).get_file()
+        actual = TutorParser(ids_only, sort_key=sort_key, dimensions=dimensions).get_file()
+        assert actual.to_csv(index=False) == expected.to_csv(index=False)
+    # One query per table, the second report is served from the cache
+    assert db.queries == 2
@@ -0,0 +1,178 @@
+import os
+import logging
+import threading
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pandas as pd
+from Config.Spill import ChunkedFrame
+
+
+"""
+    Serializes report frames to CSV, formatting row chunks in parallel and
+    writing each one to the output file as soon as it is ready. The output
+    is byte identical to df.to_csv(index=False). A ChunkedFrame is written
+    chunk by chunk, as pd.concat(chunks).to_csv(index=False) would be.
+
+    CSV_ENGINE: process (default), thread or serial
+"""
+
+logger = logging.getLogger(__name__)
+
+PROCESS = 'process'
+THREAD = 'thread'
+SERIAL = 'serial'
+
+CSV_ENGINE = os.getenv("CSV_ENGINE", PROCESS)
+CSV_WORKERS = int(os.getenv("CSV_WORKERS", os.cpu_count() or 1))
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", 20000))
+# Below this many cells the pool overhead outweighs the formatting work
+CSV_PARALLEL_MIN_CELLS = int(os.getenv("CSV_PARALLEL_MIN_CELLS", 1000000))
+
+_executors = {}
+# Upload and job threads serialize at the same time, each pool is created once
+_executors_lock = threading.Lock()
+
+
+def _format_chunk(args) -> bytes:
+    chunk, header = args
+    return chunk.to_csv(index=False, header=header).encode("utf-8")
+
+
+def _get_executor(engine, workers):
+    """One pool per worker process, created on first use and reused by later jobs."""
+    key = (engine, workers)
+    with _executors_lock:
+        if key not in _executors:
+            if engine == PROCESS:
+                # forkserver children never inherit the consumer's threads or sockets
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(["pandas", "S3.Csv"])
+                _executors[key] = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            else:
+                _executors[key] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="csv")
+        return _executors[key]
+
+
+def _drop_executor(engine, workers, executor):
+    """Forgets a broken pool, unless another thread already replaced it with a new one."""
+    with _executors_lock:
+        if _executors.get((engine, workers)) is executor:
+            del _executors[(engine, workers)]
+    # The other threads mapping on a broken pool get BrokenProcessPool as well
+    executor.shutdown(wait=False)
+
+
+def _is_datetime(dtype) -> bool:
+    return dtype.kind in "mM" or isinstance(dtype, pd.DatetimeTZDtype)
+
+
+def _preformat_datetimes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+        pandas picks the text format of datetime and timedelta columns from the
+        whole column (date only, sub-second precision), so they are formatted
+        once up front and chunks can no longer disagree.
+    """
+    positions = [i for i, dtype in enumerate(df.dtypes) if _is_datetime(dtype)]
+    if not positions:
+        return df
+    df = df.copy(deep=False)
+    for i in positions:
+        column = df.iloc[:, i]
+        df.isetitem(i, column.astype(str).where(column.notna(), "").astype(object))
+    return df
+
+
+def _finest(column: pd.Series) -> pd.Series:
+    """
+        The value of a datetime or timedelta column that pandas needs the most
+        digits for (a time of day over midnight, sub-second over seconds), as a
+        one row Series; empty when the column has no values.
+    """
+    values = column.dropna()
+    if values.empty:
+        return values
+    ticks = values.dt.tz_localize(None) if isinstance(values.dtype, pd.DatetimeTZDtype) else values
+    if ticks.dtype.kind == "M":
+        ticks = ticks - ticks.dt.normalize()
+    ticks = ticks.to_numpy().astype("timedelta64[ns]").astype(np.int64)
+    digits = sum((ticks % unit != 0).astype(np.int8) for unit in (86400 * 10**9, 10**9, 10**6, 10**3))
+    return values.iloc[[int(np.argmax(digits))]]
+
+
+def _write_frame(df, out, engine, workers, chunk_rows, header=True) -> int:
+    rows = len(df)
+    if engine == SERIAL or workers <= 1 or rows <= chunk_rows or rows * len(df.columns) < CSV_PARALLEL_MIN_CELLS:
+        return out.write(df.to_csv(index=False, header=header).encode("utf-8"))
+
+    df = _preformat_datetimes(df)
+    starts = range(0, rows, chunk_rows)
+    chunks = ((df.iloc[start:start + chunk_rows], header and start == 0) for start in starts)
+    written = 0
+    done = 0
+    executor = _get_executor(engine, workers)
+    try:
+        # map() yields in submission order, so chunks land in row order
+        for data in executor.map(_format_chunk, chunks):
+            written += out.write(data)
+            done += 1
+    except BrokenProcessPool:
+        # A pool child died (e.g. OOM killed): drop the pool so the next call gets a fresh one
+        logger.warning("CSV process pool broke, writing the rest of this file serially")
+        _drop_executor(engine, workers, executor)
+        for start in starts[done:]:
+            written += out.write(_format_chunk((df.iloc[start:start + chunk_rows], header and start == 0)))
+    return written
+
+
+def _write_chunked(frames: ChunkedFrame, out, engine, workers, chunk_rows) -> int:
+    """
+        A first pass finds the dtype every column has once the chunks are
+        concatenated and, for datetime columns, the value needing the most
+        digits; the second formats each chunk with those and writes it, with
+        the header on the first chunk only.
+    """
+    heads = []
+    finest = {}
+    for frame in frames:
+        heads.append(frame.iloc[:0])
+        for name, dtype in frame.dtypes.items():
+            if _is_datetime(dtype):
+                column = frame[name] if name not in finest else pd.concat([finest[name], frame[name]])
+                finest[name] = _finest(column)
+    if not heads:
+        return 0
+    dtypes = pd.concat(heads).dtypes
+
+    written = 0
+    for i, frame in enumerate(frames):
+        changed = {name: dtype for name, dtype in dtypes.items() if frame[name].dtype != dtype}
+        if changed:
+            frame = frame.astype(changed)
+        frame = frame.copy(deep=False)
+        for name, dtype in dtypes.items():
+            if not _is_datetime(dtype):
+                continue
+            column = frame[name]
+            # Formatted next to the finest value, as it would be in the whole column
+            exemplar = finest.get(name, column.iloc[:0]).astype(dtype)
+            text = pd.concat([column, exemplar], ignore_index=True).astype(str).iloc[:len(column)]
+            text.index = column.index
+            frame[name] = text.where(column.notna(), "").astype(object)
+        written += _write_frame(frame, out, engine, workers, chunk_rows, header=i == 0)
+    return written
+
+
+def write_csv(df, out, engine=CSV_ENGINE, workers=CSV_WORKERS, chunk_rows=CSV_CHUNK_ROWS) -> int:
+    """Writes df (a DataFrame or ChunkedFrame) as CSV to the binary file out, returns the number of bytes written."""
+    if isinstance(df, ChunkedFrame):
+        return _write_chunked(df, out, engine, workers, chunk_rows)
+    return _write_frame(df, out, engine, workers, chunk_rows)
+
+
+def to_csv_bytes(df: pd.DataFrame, engine=CSV_ENGINE, workers=CSV_WORKERS, chunk_rows=CSV_CHUNK_ROWS) -> bytes:
+    buffer = BytesIO()
+    write_csv(df, buffer, engine, workers, chunk_rows)
+    return buffer.getvalue()
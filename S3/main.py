@@ -1,31 +1,76 @@
+import os
+import zipfile
+import tempfile
 import boto3
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import BotoCoreError, ClientError
-from io import StringIO
 from typing import Optional
 import pandas as pd
+from S3.Csv import write_csv
+from Config.SlowJobs import stage, note, bind
 
 ## Asuuming the base role for CLI
 s3 = boto3.client('s3')
 
+S3_UPLOAD_WORKERS = int(os.getenv("S3_UPLOAD_WORKERS", 4))
+# Upload bodies larger than this are spooled to a temp file instead of memory
+S3_SPOOL_BYTES = int(os.getenv("S3_SPOOL_BYTES", 64 * 1024 * 1024))
+
+
+def _spool():
+    return tempfile.SpooledTemporaryFile(max_size=S3_SPOOL_BYTES)
+
 class S3Instance:
     def __init__(self, bucket):
         self.bucket = bucket    
 
     def put_object(self, key, df: Optional[pd.DataFrame])-> bool:
-        try:
-            csv_buffer = StringIO()
-            df.to_csv(csv_buffer, index=False)
-            print(f"Uploading to s3 with key {key}")
-            s3.put_object(
-                Bucket=self.bucket,
-                Key=str("reports/"+ key),
-                Body=csv_buffer.getvalue(),
-                ContentType='text/csv'
-            )
-            return True
-        except (BotoCoreError, ClientError) as e:
-            return False
-    
-
-
-    
\ No newline at end of file
+        # Same bytes as df.to_csv(index=False), streamed to the body as chunks are formatted
+        with _spool() as body:
+            try:
+                with stage("serialize"):
+                    note("csv_bytes", write_csv(df, body))
+                body.seek(0)
+                print(f"Uploading to s3 with key {key}")
+                with stage("upload"):
+                    s3.put_object(
+                        Bucket=self.bucket,
+                        Key=str("reports/"+ key),
+                        Body=body,
+                        ContentType='text/csv'
+                    )
+                return True
+            except (BotoCoreError, ClientError) as e:
+                return False
+
+    def put_objects(self, files: dict) -> dict:
+        """Uploads {key: DataFrame} in parallel, returns {key: uploaded}."""
+        if len(files) <= 1:
+            return {key: self.put_object(key, df) for key, df in files.items()}
+        with ThreadPoolExecutor(max_workers=min(S3_UPLOAD_WORKERS, len(files))) as pool:
+            # The pool threads record into this job's stages and counters
+            results = pool.map(bind(lambda item: self.put_object(*item)), files.items())
+            return dict(zip(files.keys(), results))
+
+    def put_zip(self, key, files: dict) -> bool:
+        """Uploads {key: DataFrame} as the CSV files of one zip archive."""
+        with _spool() as zip_buffer:
+            try:
+                with stage("serialize"):
+                    with zipfile.ZipFile(zip_buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                        for name, df in files.items():
+                            # Keeps the folders, outputs may share a file name
+                            with archive.open(name.lstrip("/"), "w", force_zip64=True) as entry:
+                                note("csv_bytes", write_csv(df, entry))
+                note("zip_bytes", zip_buffer.tell())
+                zip_buffer.seek(0)
+                with stage("upload"):
+                    s3.put_object(
+                        Bucket=self.bucket,
+                        Key=str("reports/"+ key),
+                        Body=zip_buffer,
+                        ContentType='application/zip'
+                    )
+                return True
+            except (BotoCoreError, ClientError) as e:
+                return False
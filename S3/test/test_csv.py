@@ -0,0 +1,114 @@
+# tests/test_csv.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from S3.Csv import to_csv_bytes, THREAD, PROCESS
+from Config.Spill import ChunkedFrame
+
+
+def _report_frame(rows=300):
+    rng = np.random.default_rng(0)
+    dates = pd.Series(pd.date_range("2025-01-01", periods=rows, freq="D"))
+    # Only the last row has a time of day, so a chunk on its own would look date only
+    mixed = dates.copy()
+    mixed.iloc[-1] = mixed.iloc[-1] + pd.Timedelta(hours=3, microseconds=5)
+    with_nat = dates.copy()
+    with_nat.iloc[[2, rows - 5]] = pd.NaT
+    return pd.DataFrame({
+        "id": rng.integers(0, 9, rows),
+        "score": np.where(rng.random(rows) < 0.1, np.nan, rng.random(rows)),
+        "notes": rng.choice(np.array(["ok", "a,b", 'say "hi"', "", None], dtype=object), rows),
+        "session_date": dates,
+        "mixed": mixed,
+        "with_nat": with_nat,
+        "tz": dates.dt.tz_localize("UTC"),
+        "duration": pd.to_timedelta(rng.integers(0, 100, rows), unit="m"),
+        pd.Timestamp("2025-09-01"): rng.choice(np.array(["P", "N", "P ,P"], dtype=object), rows),
+    })
+
+
+@pytest.mark.parametrize("engine", [THREAD, PROCESS])
+def test_parallel_output_is_byte_identical_to_to_csv(engine, monkeypatch):
+    monkeypatch.setattr("S3.Csv.CSV_PARALLEL_MIN_CELLS", 0)
+    df = _report_frame()
+    expected = df.to_csv(index=False).encode("utf-8")
+    assert to_csv_bytes(df, engine=engine, workers=3, chunk_rows=47) == expected
+
+
+def test_small_frames_are_written_serially():
+    df = _report_frame(rows=10)
+    assert to_csv_bytes(df, engine=THREAD, workers=3, chunk_rows=47) == df.to_csv(index=False).encode("utf-8")
+
+
+def test_chunked_frame_is_written_like_the_concatenated_frame():
+    df = _report_frame()
+    chunks = [df.iloc[start:start + 47].reset_index(drop=True) for start in range(0, len(df), 47)]
+    for chunk in chunks:
+        chunk["count"] = range(len(chunk))
+    # One chunk with a missing count makes the whole concatenated column float
+    chunks[2].loc[0, "count"] = np.nan
+    expected = pd.concat(chunks, ignore_index=True).to_csv(index=False).encode("utf-8")
+    assert to_csv_bytes(ChunkedFrame(lambda: iter(chunks))) == expected
+
+
+def test_broken_process_pool_is_dropped_and_file_written_serially(monkeypatch):
+    from concurrent.futures.process import BrokenProcessPool
+    import S3.Csv as Csv
+
+    class BrokenPool:
+        def map(self, fn, chunks):
+            yield fn(next(chunks))
+            raise BrokenProcessPool("child killed")
+
+        def shutdown(self, wait=True):
+            self.closed = True
+
+    df = _report_frame()
+    key = (PROCESS, 3)
+    monkeypatch.setitem(Csv._executors, key, BrokenPool())
+    monkeypatch.setattr(Csv, "CSV_PARALLEL_MIN_CELLS", 0)
+
+    assert to_csv_bytes(df, engine=PROCESS, workers=3, chunk_rows=47) == df.to_csv(index=False).encode("utf-8")
+    assert key not in Csv._executors
+
+
+def test_concurrent_first_uploads_create_one_pool(monkeypatch):
+    import threading
+    import time
+    import S3.Csv as Csv
+
+    created = []
+
+    class SlowPool:
+        def __init__(self, **kwargs):
+            # Widens the window in which a second thread could also create one
+            time.sleep(0.05)
+            created.append(self)
+
+    monkeypatch.setattr(Csv, "ThreadPoolExecutor", SlowPool)
+    monkeypatch.setattr(Csv, "_executors", {})
+    pools = []
+    threads = [threading.Thread(target=lambda: pools.append(Csv._get_executor(THREAD, 5))) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(pool is created[0] for pool in pools)
+
+
+def test_broken_pool_does_not_drop_its_replacement(monkeypatch):
+    import S3.Csv as Csv
+
+    class Pool:
+        def shutdown(self, wait=True):
+            self.closed = True
+
+    broken, replacement = Pool(), Pool()
+    monkeypatch.setattr(Csv, "_executors", {(PROCESS, 3): replacement})
+    Csv._drop_executor(PROCESS, 3, broken)
+
+    assert Csv._executors == {(PROCESS, 3): replacement}
+    assert broken.closed
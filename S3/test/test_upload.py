@@ -0,0 +1,67 @@
+# tests/test_upload.py
+import os
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import io
+import zipfile
+from unittest import mock
+
+import pandas as pd
+from botocore.exceptions import ClientError
+
+from S3.main import S3Instance
+from Config.SlowJobs import SlowJobRecorder
+
+
+class FakeS3Client:
+    def __init__(self, fail=()):
+        self.objects = {}
+        self.fail = set(fail)
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        if Key in self.fail:
+            raise ClientError({"Error": {"Code": "500", "Message": "boom"}}, "PutObject")
+        # Bodies are spooled files, read before S3Instance closes them
+        Body = Body.read()
+        self.objects[Key] = (Body, ContentType)
+
+
+def _files(count):
+    return {f"org/{i}.csv": pd.DataFrame({"id": [i, i + 1]}) for i in range(count)}
+
+
+def test_put_objects_reports_each_upload():
+    client = FakeS3Client(fail=["reports/org/1.csv"])
+    with mock.patch("S3.main.s3", client):
+        uploaded = S3Instance("bucket").put_objects(_files(3))
+
+    assert uploaded == {"org/0.csv": True, "org/1.csv": False, "org/2.csv": True}
+    assert client.objects["reports/org/2.csv"] == (b"id\n2\n3\n", "text/csv")
+
+
+def test_put_zip_writes_one_entry_per_file():
+    client = FakeS3Client()
+    with mock.patch("S3.main.s3", client):
+        assert S3Instance("bucket").put_zip("org/all.zip", _files(2))
+
+    body, content_type = client.objects["reports/org/all.zip"]
+    archive = zipfile.ZipFile(io.BytesIO(body))
+    assert content_type == "application/zip"
+    assert archive.namelist() == ["org/0.csv", "org/1.csv"]
+    assert archive.read("org/1.csv") == b"id\n1\n2\n"
+
+
+def test_put_zip_returns_false_when_upload_fails():
+    with mock.patch("S3.main.s3", FakeS3Client(fail=["reports/org/all.zip"])):
+        assert not S3Instance("bucket").put_zip("org/all.zip", _files(1))
+
+
+def test_parallel_uploads_record_into_the_calling_job():
+    recorder = SlowJobRecorder(db=None, threshold=float("inf"))
+    with mock.patch("S3.main.s3", FakeS3Client()):
+        with recorder.job(b"{}") as record:
+            S3Instance("bucket").put_objects(_files(3))
+
+    # b"id\n0\n1\n" + b"id\n1\n2\n" + b"id\n2\n3\n"
+    assert record["counters"]["csv_bytes"] == 21
+    assert set(record["stages"]) == {"serialize", "upload"}
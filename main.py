@@ -1,10 +1,17 @@
 import os
-from Config.RabbitMQ import RabbitMQ
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from Config.RabbitMQ import RabbitMQ, ThreadSafeChannel
 from Config.PostgresClient import PostgresClient
-from Config.Client import Client
+from Config.Job import Job, InvalidJob, TUTOR, STUDENT, report_keys
 from Parser.TutorParser import TutorParser
-from Parser.StudentParser import StudentParser
+from Parser.StudentParser import StudentParser, SESSIONS, ASSESSMENTS
 from S3.main import S3Instance
+from Config.Spill import release
+from Config.Dimensions import DimensionCache
+from Config.SlowJobs import SlowJobRecorder, stage
+from Config.Concurrency import ConcurrencyController, CONTROL_INTERVAL_SECONDS, CONCURRENCY_METRICS_SECONDS
+from Config.Fairness import FairScheduler, FAIR_SCHEDULING, FAIR_BUFFER_SIZE
 from dotenv import load_dotenv
 import time
 import json
@@ -26,68 +33,327 @@ QUEUE        = os.getenv("QUEUE")
 ROUTING_KEY  = os.getenv("ROUTING_KEY")
 RABBIT_LOCAL  = os.getenv("RABBIT_LOCAL")
 PREFETCH_COUNT = 1
+# Run several jobs at once, sized by memory use, instead of one at a time
+ADAPTIVE_CONCURRENCY = os.getenv("ADAPTIVE_CONCURRENCY") == "1"
 EXCHANGE_TYPE = "direct"
-TUTOR = "tutor"
-STUDENT = "student"
 DONE = "DONE"
+FAILED = "FAILED"
+# preview_status of a preview that had no rows, so nothing was uploaded
+EMPTY = "EMPTY"
 ZERO = 0
+# Rows (tutors or students for grouped reports) read for the preview file of payloads with "preview": true
+PREVIEW_ROWS = int(os.getenv("PREVIEW_ROWS", 200))
+PREVIEW_SUFFIX = ".preview"
 
 
-def create_callback(db):
+def preview_key(key):
+    """reports/a/b.csv is previewed at reports/a/b.preview.csv"""
+    root, ext = os.path.splitext(key)
+    return f"{root}{PREVIEW_SUFFIX}{ext}"
+
+
+def create_callback(db, dimensions=None):
+    # Tutor, program and subject names, shared by every job of this worker
+    dimensions = DimensionCache(db) if dimensions is None else dimensions.using(db)
+
+    # Writes a forensic record for jobs slower than SLOW_JOB_SECONDS
+    recorder = SlowJobRecorder(db)
+
     def on_message_test(channel, method, properties, body):
-        print(body)
-        client = Client(body)        
-        s3 = S3Instance("tracker-client-storage")
-        entity = client.get_entity()
-        if entity == TUTOR:
-            data = db.get_tutor_file_data(client.get_body())
-            if data is None:
-                channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)      
-                return
-            tutor_parser = TutorParser(data, client.get_sort_key())
-            file = tutor_parser.get_file()
-            if file is None:
-                db.update_organization_report((DONE, ZERO, client.get_s3_output_key()))
-                channel.basic_ack(delivery_tag=method.delivery_tag)      
-                return 
-            s3.put_object(client.get_s3_output_key(), file)
-            db.update_organization_report((DONE, ZERO, client.get_s3_output_key()))
-            channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)  
-        elif entity == STUDENT:
-            student_sessions = db.get_student_sessions(client.get_body())
-            student_assesments = db.get_student_assessments(client.get_body())
-            if student_sessions is None:
+        logger.debug(f"Received job: {body}")
+        with recorder.job(body):
+            try:
+                job = Job.parse(body)
+            except InvalidJob as e:
+                # Dropped before any query runs, redelivering can't fix the payload
+                logger.warning(f"Rejecting invalid job: {e}")
+                try:
+                    for key in report_keys(body):
+                        db.update_organization_report((FAILED, ZERO, key))
+                except RuntimeError:
+                    logger.warning("Unable to mark the rejected job's reports FAILED")
                 channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
                 return
-            student_parser = StudentParser(student_sessions, student_assesments, client.get_sort_key(), client.get_data_type())
+            s3 = S3Instance("tracker-client-storage")
+            entity = job.entity
+            if job.preview and not job.outputs:
+                handle_preview(job, s3, entity)
+            if job.outputs:
+                handle_bundle(channel, method, job, s3)
+            elif entity == TUTOR:
+                with stage("query"):
+                    data = db.get_tutor_file_data(job)
+                try:
+                    handle_tutor(channel, method, job, s3, data)
+                finally:
+                    # Removes the temp files of fetches that spilled to disk
+                    release(data)
+            elif entity == STUDENT:
+                with stage("query"):
+                    student_sessions = db.get_student_sessions(job)
+                    student_assesments = db.get_student_assessments(job)
+                try:
+                    handle_student(channel, method, job, s3, student_sessions, student_assesments)
+                finally:
+                    release(student_sessions, student_assesments)
+
+    def handle_preview(job, s3, entity):
+        """
+            Publishes the report built from its first PREVIEW_ROWS rows at
+            preview_key() and records preview_status, before the full report
+            is generated. A failed preview never fails the job.
+        """
+        key = preview_key(job.s3_output_key)
+        sessions = assessments = None
+        try:
+            with stage("preview"):
+                if entity == TUTOR:
+                    sessions = db.get_tutor_file_data(job, PREVIEW_ROWS)
+                    parser = TutorParser(sessions, job.sort_key, job.layout, dimensions)
+                elif entity == STUDENT:
+                    sessions = db.get_student_sessions(job, PREVIEW_ROWS)
+                    if job.data_type == ASSESSMENTS:
+                        assessments = db.get_student_assessments(job, PREVIEW_ROWS)
+                    parser = StudentParser(sessions, assessments, job.sort_key, job.data_type, job.layout, dimensions)
+                else:
+                    return
+                file = parser.get_file()
+                if file is None:
+                    status = EMPTY
+                else:
+                    status = DONE if s3.put_object(key, file) else FAILED
+            db.update_preview_status((status, job.s3_output_key))
+        except Exception:
+            logger.exception(f"Preview {key} failed, generating the full report")
+            try:
+                db.update_preview_status((FAILED, job.s3_output_key))
+            except RuntimeError:
+                logger.warning("Unable to record the preview status")
+        finally:
+            release(sessions, assessments)
+
+    def handle_tutor(channel, method, job, s3, data):
+        if data is None:
+            channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)      
+            return
+        with stage("parse"):
+            tutor_parser = TutorParser(data, job.sort_key, job.layout, dimensions)
+            file = tutor_parser.get_file()
+        if file is None:
+            db.update_organization_report((DONE, ZERO, job.s3_output_key))
+            channel.basic_ack(delivery_tag=method.delivery_tag)      
+            return 
+        s3.put_object(job.s3_output_key, file)
+        db.update_organization_report((DONE, ZERO, job.s3_output_key))
+        channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)  
+
+    def handle_student(channel, method, job, s3, student_sessions, student_assesments):
+        if student_sessions is None:
+            channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
+        with stage("parse"):
+            student_parser = StudentParser(student_sessions, student_assesments, job.sort_key, job.data_type, job.layout, dimensions)
             file = student_parser.get_file()
-            if file is None:
-                db.update_organization_report((DONE, ZERO, client.get_s3_output_key()))
+        if file is None:
+            db.update_organization_report((DONE, ZERO, job.s3_output_key))
+            channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return 
+        s3.put_object(job.s3_output_key, file)
+        db.update_organization_report((DONE, ZERO, job.s3_output_key))
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+
+    def handle_bundle(channel, method, job, s3):
+        """
+            Produces every requested output of the payload from one fetch per
+            underlying dataset (tutor sessions, student sessions, assessments).
+        """
+        fetchers = {
+            TUTOR: db.get_tutor_file_data,
+            SESSIONS: db.get_student_sessions,
+            ASSESSMENTS: db.get_student_assessments,
+        }
+        datasets = {}
+
+        def dataset(name):
+            if name not in datasets:
+                with stage("query"):
+                    datasets[name] = fetchers[name](job)
+            return datasets[name]
+
+        try:
+            files = {}
+            for output in job.outputs:
+                entity = output.entity
+                with stage("parse"):
+                    if entity == TUTOR:
+                        parser = TutorParser(dataset(TUTOR), output.sort_key, output.layout, dimensions)
+                    else:
+                        assessments = dataset(ASSESSMENTS) if output.data_type == ASSESSMENTS else None
+                        parser = StudentParser(dataset(SESSIONS), assessments, output.sort_key, output.data_type, output.layout, dimensions)
+                    files[output.s3_output_key] = parser.get_file()
+
+            ready = {key: file for key, file in files.items() if file is not None}
+            # S3Instance times the serialize and upload stages itself
+            if job.zip:
+                uploaded = {job.s3_output_key: s3.put_zip(job.s3_output_key, ready) if ready else True}
+            else:
+                # Outputs without rows are DONE without an upload, as for single reports
+                uploaded = {key: True for key in files}
+                uploaded.update(s3.put_objects(ready))
+            for key, ok in uploaded.items():
+                db.update_organization_report((DONE if ok else FAILED, ZERO, key))
+            if all(uploaded.values()):
+                channel.basic_ack(delivery_tag=method.delivery_tag)
+            else:
+                logger.error(f"Bundle upload failed for {[key for key, ok in uploaded.items() if not ok]}")
                 channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
-                return 
-            s3.put_object(client.get_s3_output_key(), file)
-            db.update_organization_report((DONE, ZERO, client.get_s3_output_key()))
-            channel.basic_ack(delivery_tag=method.delivery_tag)
+        finally:
+            release(*datasets.values())
 
     return on_message_test
 
 
-def main():
+def tenant_of(body):
+    """location_id of a message, None for payloads the job will reject."""
+    try:
+        return Job.parse(body).location_id
+    except InvalidJob:
+        return None
+
+
+def consume_adaptive(mq, controller, scheduler=None, stop=None):
+    """
+        Runs jobs on a thread pool, each thread with its own PostgresClient.
+        Every CONTROL_INTERVAL_SECONDS the controller's limit becomes the number
+        of jobs run at once, and consuming is paused while memory is above its
+        pause threshold. With a FairScheduler, FAIR_BUFFER_SIZE more messages
+        are prefetched and buffered, and the next job is picked round robin
+        across location_ids instead of in arrival order. Returns once the
+        stop event is set and the running jobs have finished.
+    """
+    connection = mq.get_connection()
+    channel = mq.get_channel()
+    local = threading.local()
+    clients = []
+    # One name cache for all job threads, each loading misses on its own connection
+    dimensions = DimensionCache(None)
+    executor = ThreadPoolExecutor(max_workers=controller.max_jobs, thread_name_prefix="job")
+    # Without fair scheduling everything is one tenant, i.e. FIFO
+    fair = scheduler is not None
+    scheduler = scheduler if fair else FairScheduler(weights={})
+    buffer_size = FAIR_BUFFER_SIZE if fair else 0
+    inflight = [0]
+    inflight_lock = threading.Lock()
+
+    def thread_callback():
+        if not hasattr(local, "callback"):
+            db = PostgresClient()
+            clients.append(db)
+            local.callback = create_callback(db, dimensions)
+        return local.callback
+
+    def run(method, properties, body):
+        job_channel = ThreadSafeChannel(connection, channel)
+        controller.job_started(method.delivery_tag)
+        try:
+            thread_callback()(job_channel, method, properties, body)
+        except Exception:
+            logger.exception("Report job failed")
+            if not job_channel.settled:
+                job_channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+        finally:
+            controller.job_finished(method.delivery_tag)
+            with inflight_lock:
+                inflight[0] -= 1
+            # Wakes the consume loop to start the next buffered job
+            connection.add_callback_threadsafe(lambda: None)
+
+    def dispatch(channel_, method, properties, body):
+        tenant = tenant_of(body) if fair else None
+        scheduler.push(tenant, (method, properties, body))
+
+    def start_jobs():
+        # Buffered jobs wait in the scheduler while memory is above the pause threshold
+        while scheduler and not controller.paused() and inflight[0] < controller.limit():
+            tenant, job = scheduler.pop()
+            with inflight_lock:
+                inflight[0] += 1
+            executor.submit(run, *job)
+
+    mq.set_prefetch(controller.limit() + buffer_size)
+    mq.set_callback(dispatch)
+    decided = reported = time.monotonic()
+    try:
+        while stop is None or not stop.is_set():
+            connection.process_data_events(time_limit=CONTROL_INTERVAL_SECONDS)
+            if time.monotonic() - decided >= CONTROL_INTERVAL_SECONDS:
+                decided = time.monotonic()
+                limit, paused = controller.decide(mq.queue_depth() + len(scheduler))
+                if decided - reported >= CONCURRENCY_METRICS_SECONDS:
+                    # A steady worker still reports its memory and queue every so often
+                    reported = decided
+                    logger.info(f"concurrency {json.dumps(controller.metrics())}")
+                mq.set_prefetch(limit + buffer_size)
+                if paused and not mq.is_paused():
+                    mq.pause()
+                elif not paused and mq.is_paused():
+                    mq.resume()
+            start_jobs()
+    finally:
+        try:
+            # Buffered jobs that never started go back to the queue with the cancel
+            mq.pause()
+            # Keeps serving heartbeats and the jobs' acks while the running jobs finish
+            while inflight[0] > 0:
+                connection.process_data_events(time_limit=CONTROL_INTERVAL_SECONDS)
+            executor.shutdown(wait=True)
+            while scheduler:
+                tenant, (method, properties, body) = scheduler.pop()
+                channel.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            # Deliver the acks the last jobs queued on the connection thread
+            connection.process_data_events(time_limit=0)
+        finally:
+            executor.shutdown(wait=False)
+            for db in clients:
+                db.close()
+
+
+def consume_until(mq, stop):
+    """start_consuming() that returns after the current job once stop is set."""
+    connection = mq.get_connection()
+    while not stop.is_set():
+        connection.process_data_events(time_limit=CONTROL_INTERVAL_SECONDS)
+    # Hands delivered but unstarted messages back to the queue
+    mq.pause()
+
+
+def main(stop=None):
+    """Consumes until interrupted, or until stop (a threading.Event) is set."""
     mq = RabbitMQ(PREFETCH_COUNT, EXCHANGE, QUEUE, ROUTING_KEY, EXCHANGE_TYPE)
-    db = PostgresClient()
-    callback = create_callback(db)
-    mq.set_callback(callback)
+    db = None
     channel = mq.get_channel()
     connection = mq.get_connection()
     try:
         logging.info(f"RabbitMQ consuming on {QUEUE} with routing key {ROUTING_KEY}")
-        channel.start_consuming()
+        if ADAPTIVE_CONCURRENCY or FAIR_SCHEDULING:
+            # A fixed controller keeps PREFETCH_COUNT jobs running when only fairness is on
+            controller = ConcurrencyController() if ADAPTIVE_CONCURRENCY else ConcurrencyController(PREFETCH_COUNT, PREFETCH_COUNT, memory_limit=0)
+            consume_adaptive(mq, controller, FairScheduler() if FAIR_SCHEDULING else None, stop)
+        else:
+            db = PostgresClient()
+            callback = create_callback(db)
+            mq.set_callback(callback)
+            if stop is None:
+                channel.start_consuming()
+            else:
+                consume_until(mq, stop)
     except KeyboardInterrupt as e:
         logging.error("Error occured unable to start consuming from RabbitMQ")
     finally:
         channel.close()
         connection.close()
-        db.close()
+        if db is not None:
+            db.close()
 
 
 if __name__ == "__main__":
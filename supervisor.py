@@ -0,0 +1,116 @@
+import os
+import gc
+import time
+import signal
+import logging
+import threading
+import multiprocessing
+
+# Every worker already has a core of its own, so CSVs are written in-process
+os.environ.setdefault("CSV_ENGINE", "serial")
+
+# Imported once here and shared copy-on-write with the forked workers
+import pandas  # noqa: F401,E402
+import pyarrow  # noqa: F401,E402
+import main  # noqa: E402
+
+logger = logging.getLogger("supervisor")
+
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", os.cpu_count() or 1))
+# Seconds a draining worker gets to finish its job before it is killed
+WORKER_DRAIN_SECONDS = float(os.getenv("WORKER_DRAIN_SECONDS", 300))
+# First restart delay of a crashed worker, doubled while it keeps crashing
+WORKER_RESTART_SECONDS = float(os.getenv("WORKER_RESTART_SECONDS", 1))
+WORKER_MAX_RESTART_SECONDS = float(os.getenv("WORKER_MAX_RESTART_SECONDS", 60))
+# A worker that ran at least this long before exiting is restarted without backoff
+WORKER_STABLE_SECONDS = float(os.getenv("WORKER_STABLE_SECONDS", 60))
+POLL_SECONDS = 0.5
+
+
+def work(slot):
+    """Body of a forked worker: its own RabbitMQ channel and DB connection, drained on SIGTERM."""
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    # Ctrl+C reaches the whole process group, the supervisor forwards it as SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logger.info(f"Worker {slot} started with pid {os.getpid()}")
+    main.main(stop)
+    logger.info(f"Worker {slot} drained")
+
+
+class Supervisor:
+    """
+        Forks processes worker processes running main.main() after the heavy
+        modules are imported, restarts the ones that exit while the supervisor
+        is running (with backoff while they keep crashing), and on SIGTERM or
+        SIGINT asks every worker to finish its current job and exit.
+    """
+
+    def __init__(self, processes=WORKER_PROCESSES, target=work):
+        self.processes = max(processes, 1)
+        self.target = target
+        self.context = multiprocessing.get_context("fork")
+        self.stopping = False
+        # slot: (process, started_at)
+        self.workers = {}
+        # slot: (restart delay, earliest restart time)
+        self.backoff = {}
+
+    def spawn(self, slot):
+        process = self.context.Process(target=self.target, args=(slot,), name=f"worker-{slot}")
+        process.start()
+        self.workers[slot] = (process, time.monotonic())
+
+    def stop(self, signum=None, frame=None):
+        if not self.stopping:
+            logger.info("Draining workers")
+        self.stopping = True
+
+    def reap(self):
+        """Notices exited workers and respawns them once their backoff has passed."""
+        now = time.monotonic()
+        for slot in range(self.processes):
+            if slot in self.workers:
+                process, started = self.workers[slot]
+                if process.is_alive():
+                    continue
+                process.join()
+                del self.workers[slot]
+                delay = WORKER_RESTART_SECONDS
+                if now - started < WORKER_STABLE_SECONDS and slot in self.backoff:
+                    delay = min(self.backoff[slot][0] * 2, WORKER_MAX_RESTART_SECONDS)
+                self.backoff[slot] = (delay, now + delay)
+                logger.warning(f"Worker {slot} (pid {process.pid}) exited with code {process.exitcode}, restarting in {delay:.1f}s")
+            elif now >= self.backoff.get(slot, (0, 0))[1]:
+                self.spawn(slot)
+
+    def drain(self, timeout=WORKER_DRAIN_SECONDS):
+        for process, _ in self.workers.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        for slot, (process, _) in self.workers.items():
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning(f"Worker {slot} did not drain in {timeout:.0f}s, killing it")
+                process.kill()
+                process.join()
+        self.workers = {}
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        # Keeps the imported modules out of the collector, so forks don't copy their pages
+        gc.freeze()
+        logger.info(f"Starting {self.processes} worker processes")
+        try:
+            while not self.stopping:
+                self.reap()
+                time.sleep(POLL_SECONDS)
+        finally:
+            self.drain()
+        logger.info("All workers stopped")
+
+
+if __name__ == "__main__":
+    Supervisor().run()
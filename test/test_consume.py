@@ -0,0 +1,167 @@
+# tests/test_consume.py
+import os
+os.environ.setdefault("RABBITMQ_PORT", "5672")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import queue
+import threading
+from unittest import mock
+
+import pytest
+
+import main
+from Config.Fairness import FairScheduler
+
+
+class FakeChannel:
+    """Records acks and nacks with the thread that sent them."""
+
+    def __init__(self):
+        self.acks = []
+        self.nacks = []
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self.acks.append((delivery_tag, threading.current_thread()))
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        self.nacks.append((delivery_tag, requeue, threading.current_thread()))
+
+
+class FakeConnection:
+    """Delivers the queued messages and runs threadsafe callbacks, setting stop after rounds calls."""
+
+    def __init__(self, mq, rounds):
+        self.mq = mq
+        self.rounds = rounds
+        self.calls = 0
+        self.stop = threading.Event()
+        self.callbacks = queue.Queue()
+
+    def add_callback_threadsafe(self, callback):
+        self.callbacks.put(callback)
+
+    def process_data_events(self, time_limit=0):
+        while self.mq.messages and not self.mq.is_paused():
+            tag, body = self.mq.messages.pop(0)
+            self.mq.callback(self.mq.channel, mock.Mock(delivery_tag=tag), None, body)
+        try:
+            self.callbacks.get(timeout=0.02)()
+            while True:
+                self.callbacks.get_nowait()()
+        except queue.Empty:
+            pass
+        self.calls += 1
+        if self.calls >= self.rounds:
+            self.stop.set()
+
+
+class FakeMQ:
+    def __init__(self, bodies, rounds=5):
+        self.messages = list(enumerate(bodies, start=1))
+        self.channel = FakeChannel()
+        self.connection = FakeConnection(self, rounds)
+        self.callback = None
+        self.consuming = False
+
+    def get_connection(self):
+        return self.connection
+
+    def get_channel(self):
+        return self.channel
+
+    def set_callback(self, callback):
+        self.callback = callback
+        self.consuming = True
+
+    def pause(self):
+        self.consuming = False
+
+    def resume(self):
+        self.consuming = True
+
+    def is_paused(self):
+        return not self.consuming
+
+    def set_prefetch(self, prefetch_count):
+        pass
+
+    def queue_depth(self):
+        return len(self.messages)
+
+
+class FakeController:
+    def __init__(self, limit=2, paused=False):
+        self._limit = limit
+        self._paused = paused
+        self.max_jobs = limit
+
+    def job_started(self, job_id):
+        pass
+
+    def job_finished(self, job_id):
+        pass
+
+    def decide(self, queue_depth):
+        return self._limit, self._paused
+
+    def limit(self):
+        return self._limit
+
+    def paused(self):
+        return self._paused
+
+    def metrics(self):
+        return {}
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    """Runs consume_adaptive with job callbacks that act on their message body."""
+    bodies = []
+
+    def create_callback(db, dimensions=None):
+        def callback(channel, method, properties, body):
+            bodies.append(body)
+            if body == b"ack":
+                channel.basic_ack(delivery_tag=method.delivery_tag)
+            elif body == b"boom":
+                raise ValueError("report failed")
+        return callback
+
+    monkeypatch.setattr(main, "PostgresClient", mock.Mock)
+    monkeypatch.setattr(main, "create_callback", create_callback)
+    monkeypatch.setattr(main, "CONTROL_INTERVAL_SECONDS", 0)
+    return bodies
+
+
+def test_paused_controller_leaves_buffered_jobs_in_the_scheduler(jobs):
+    mq = FakeMQ([b"ack", b"ack", b"ack"])
+
+    main.consume_adaptive(mq, FakeController(paused=True), FairScheduler(weights={}), mq.connection.stop)
+
+    assert jobs == []
+    assert mq.channel.acks == []
+    # Requeued on shutdown, never started
+    assert [(tag, requeue) for tag, requeue, _ in mq.channel.nacks] == [(1, True), (2, True), (3, True)]
+
+
+def test_job_acks_are_sent_from_the_connection_thread(jobs):
+    mq = FakeMQ([b"ack", b"ack"])
+
+    main.consume_adaptive(mq, FakeController(), None, mq.connection.stop)
+
+    assert sorted(jobs) == [b"ack", b"ack"]
+    # Job threads hand the ack to add_callback_threadsafe instead of using the channel
+    assert sorted(tag for tag, _ in mq.channel.acks) == [1, 2]
+    assert {thread for _, thread in mq.channel.acks} == {threading.current_thread()}
+    assert mq.channel.nacks == []
+
+
+def test_job_that_raises_before_settling_is_nacked(jobs):
+    mq = FakeMQ([b"boom", b"ack"])
+
+    main.consume_adaptive(mq, FakeController(), None, mq.connection.stop)
+
+    assert [(tag, requeue) for tag, requeue, _ in mq.channel.nacks] == [(1, False)]
+    assert mq.channel.nacks[0][2] is threading.current_thread()
+    assert [tag for tag, _ in mq.channel.acks] == [2]
@@ -0,0 +1,185 @@
+# tests/test_main.py
+import os
+os.environ.setdefault("RABBITMQ_PORT", "5672")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import io
+import json
+import zipfile
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+from botocore.exceptions import ClientError
+
+import main
+from Config.test.test_dimensions import FakeDimensionDB
+
+
+class FakeS3Client:
+    """Stands in for the boto3 client, failing the uploads of the given keys."""
+
+    def __init__(self, fail=()):
+        self.objects = {}
+        self.fail = {"reports/" + key for key in fail}
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        if Key in self.fail:
+            raise ClientError({"Error": {"Code": "500", "Message": "boom"}}, "PutObject")
+        # Bodies are spooled files, read before S3Instance closes them
+        Body = Body.read()
+        self.objects[Key] = Body
+
+
+class FakeReportDB(FakeDimensionDB):
+    """Serves ids-only report rows and the dimension lookups, recording every call."""
+
+    def __init__(self):
+        super().__init__()
+        self.fetches = []
+        self.statuses = []
+        self.previews = []
+
+    def get_tutor_file_data(self, job, limit=None):
+        self.fetches.append(("tutor", limit))
+        day = datetime(2025, 9, 1, 10, 30)
+        return [
+            dict(session_id=100 + i, tutor_id=1, session_date=day + timedelta(days=i), substitute=False,
+                 student_count=2, start_time="10:30", duration=60, notes="", program_id=7)
+            for i in range(3)
+        ]
+
+    def get_student_sessions(self, job, limit=None):
+        self.fetches.append(("sessions", limit))
+        day = datetime(2025, 9, 1, 10, 15)
+        return [
+            dict(id=1, first_name="Ada", last_name="Lovelace", session_id=100 + i, absent=i == 1,
+                 duration=45, session_date=day + timedelta(days=i), subject_id=3, program_id=7)
+            for i in range(3)
+        ]
+
+    def get_student_assessments(self, job, limit=None):
+        self.fetches.append(("assessments", limit))
+        return [
+            dict(id=1, first_name="Ada", last_name="Lovelace", session_date=datetime(2025, 9, 1),
+                 session_id=100, assessment_title="Quiz", subject_id=3, letter="A", cycle=1,
+                 pre=True, mid=False, post=False, version=1, score=8, max_score=10),
+        ]
+
+    def update_organization_report(self, params):
+        self.statuses.append(params)
+
+    def update_preview_status(self, params):
+        self.previews.append(params)
+
+    def fetch_one(self, query, params=None):
+        return None
+
+
+def _run(payload, fail=()):
+    db = FakeReportDB()
+    channel = mock.Mock()
+    client = FakeS3Client(fail)
+    with mock.patch("S3.main.s3", client):
+        main.create_callback(db)(channel, mock.Mock(delivery_tag=7), None, json.dumps(payload).encode("utf-8"))
+    return db, channel, client
+
+
+def _bundle(outputs, **overrides):
+    payload = {"location_id": 3, "date": "2025-09-01T00:00:00Z", "date_end": "0001-01-01T00:00:00Z", "outputs": outputs}
+    payload.update(overrides)
+    return payload
+
+
+OUTPUTS = [
+    {"entity": "tutor", "sort_key": "all", "s3_output_key": "org3/tutors.csv"},
+    {"entity": "tutor", "sort_key": "group_tutors", "s3_output_key": "org3/tutors_grouped.csv"},
+    {"entity": "student", "data_type": "Sessions", "sort_key": "all", "s3_output_key": "org3/sessions.csv"},
+    {"entity": "student", "data_type": "Sessions", "sort_key": "group_students", "layout": "weekly", "s3_output_key": "org3/weekly.csv"},
+    {"entity": "student", "data_type": "Assessments", "sort_key": "all", "s3_output_key": "org3/assessments.csv"},
+]
+
+
+def test_bundle_fetches_each_dataset_once_and_acks():
+    db, channel, client = _run(_bundle(OUTPUTS))
+
+    assert sorted(db.fetches) == [("assessments", None), ("sessions", None), ("tutor", None)]
+    assert set(client.objects) == {"reports/" + output["s3_output_key"] for output in OUTPUTS}
+    assert sorted(db.statuses) == sorted((main.DONE, main.ZERO, output["s3_output_key"]) for output in OUTPUTS)
+    channel.basic_ack.assert_called_once_with(delivery_tag=7)
+    channel.basic_nack.assert_not_called()
+
+
+def test_zip_bundle_keeps_folders_of_outputs_sharing_a_file_name():
+    outputs = [
+        {"entity": "tutor", "sort_key": "all", "s3_output_key": "org3/a/report.csv"},
+        {"entity": "student", "data_type": "Sessions", "sort_key": "all", "s3_output_key": "org3/b/report.csv"},
+    ]
+    db, channel, client = _run(_bundle(outputs, zip=True, s3_output_key="org3/bundle.zip"))
+
+    archive = zipfile.ZipFile(io.BytesIO(client.objects["reports/org3/bundle.zip"]))
+    assert sorted(archive.namelist()) == ["org3/a/report.csv", "org3/b/report.csv"]
+    assert db.statuses == [(main.DONE, main.ZERO, "org3/bundle.zip")]
+    channel.basic_ack.assert_called_once_with(delivery_tag=7)
+
+
+def test_failed_output_is_marked_failed_and_nacked():
+    db, channel, client = _run(_bundle(OUTPUTS), fail=["org3/sessions.csv"])
+
+    assert (main.FAILED, main.ZERO, "org3/sessions.csv") in db.statuses
+    assert (main.DONE, main.ZERO, "org3/tutors.csv") in db.statuses
+    channel.basic_ack.assert_not_called()
+    channel.basic_nack.assert_called_once_with(delivery_tag=7, requeue=False)
+
+
+def test_failed_zip_is_marked_failed_and_nacked():
+    db, channel, client = _run(_bundle(OUTPUTS[:1], zip=True, s3_output_key="org3/bundle.zip"), fail=["org3/bundle.zip"])
+
+    assert db.statuses == [(main.FAILED, main.ZERO, "org3/bundle.zip")]
+    channel.basic_ack.assert_not_called()
+    channel.basic_nack.assert_called_once_with(delivery_tag=7, requeue=False)
+
+
+def test_invalid_job_marks_its_report_failed_and_nacks():
+    db, channel, client = _run({"entity": "teacher", "location_id": 3, "s3_output_key": "org3/teachers.csv"})
+
+    assert db.fetches == []
+    assert db.statuses == [(main.FAILED, main.ZERO, "org3/teachers.csv")]
+    channel.basic_nack.assert_called_once_with(delivery_tag=7, requeue=False)
+
+
+def _report(**overrides):
+    payload = {"entity": "tutor", "sort_key": "group_tutors", "location_id": 3, "preview": True,
+               "s3_output_key": "org3/tutors.csv"}
+    payload.update(overrides)
+    return payload
+
+
+def test_preview_key_is_a_sibling_of_the_report():
+    assert main.preview_key("org3/tutors.csv") == "org3/tutors.preview.csv"
+    assert main.preview_key("org3/v1.2/report") == "org3/v1.2/report.preview"
+
+
+def test_preview_is_uploaded_before_the_report_and_marked_done():
+    db, channel, client = _run(_report())
+
+    assert db.fetches == [("tutor", main.PREVIEW_ROWS), ("tutor", None)]
+    assert set(client.objects) == {"reports/org3/tutors.preview.csv", "reports/org3/tutors.csv"}
+    assert db.previews == [(main.DONE, "org3/tutors.csv")]
+    assert db.statuses == [(main.DONE, main.ZERO, "org3/tutors.csv")]
+
+
+def test_failed_preview_upload_is_marked_failed_and_the_report_still_runs():
+    db, channel, client = _run(_report(), fail=["org3/tutors.preview.csv"])
+
+    assert db.previews == [(main.FAILED, "org3/tutors.csv")]
+    assert set(client.objects) == {"reports/org3/tutors.csv"}
+    assert db.statuses == [(main.DONE, main.ZERO, "org3/tutors.csv")]
+
+
+def test_preview_without_rows_is_marked_empty():
+    with mock.patch.object(FakeReportDB, "get_tutor_file_data", lambda self, job, limit=None: None):
+        db, channel, client = _run(_report())
+
+    assert db.previews == [(main.EMPTY, "org3/tutors.csv")]
+    assert client.objects == {}
@@ -0,0 +1,67 @@
+# tests/test_supervisor.py
+import os
+os.environ.setdefault("RABBITMQ_PORT", "5672")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import time
+
+import pytest
+
+import supervisor
+from supervisor import Supervisor
+
+
+def _crash(slot):
+    os._exit(3)
+
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(supervisor, "WORKER_RESTART_SECONDS", 0.05)
+    monkeypatch.setattr(supervisor, "WORKER_MAX_RESTART_SECONDS", 0.15)
+    monkeypatch.setattr(supervisor, "WORKER_STABLE_SECONDS", 60)
+
+
+def _crash_and_reap(workers):
+    """Waits for the restarted worker to exit, then reaps it; returns its restart delay."""
+    deadline = time.monotonic() + 5
+    while 0 not in workers.workers:
+        assert time.monotonic() < deadline, "worker was not restarted"
+        time.sleep(0.01)
+        workers.reap()
+    process = workers.workers[0][0]
+    process.join()
+    assert process.exitcode == 3
+    workers.reap()
+    assert 0 not in workers.workers
+    return workers.backoff[0][0]
+
+
+def test_crashing_worker_is_restarted_with_doubling_backoff(fast_backoff):
+    workers = Supervisor(processes=1, target=_crash)
+    workers.reap()
+
+    delays = [_crash_and_reap(workers) for _ in range(4)]
+
+    assert delays == [0.05, 0.1, 0.15, 0.15]
+
+
+def test_worker_exiting_after_a_stable_run_restarts_without_backoff(fast_backoff):
+    workers = Supervisor(processes=1, target=_crash)
+    workers.reap()
+    _crash_and_reap(workers)
+    _crash_and_reap(workers)
+
+    workers.reap()
+    deadline = time.monotonic() + 5
+    while 0 not in workers.workers:
+        assert time.monotonic() < deadline, "worker was not restarted"
+        time.sleep(0.01)
+        workers.reap()
+    process, started = workers.workers[0]
+    # As if it had been running for longer than WORKER_STABLE_SECONDS
+    workers.workers[0] = (process, started - 61)
+    process.join()
+    workers.reap()
+
+    assert workers.backoff[0][0] == 0.05